@@ -3,6 +3,12 @@ from flask_login import login_required, current_user
 from backend.models.model import Subject, Chapter, Quiz, Question, User, QuizResult
 from backend.extensions import db
 from backend.utils.decorators import admin_secure_endpoint
+from backend.utils.pagination import paginated_list_response
+from backend.utils.cache import stale_while_revalidate, cache_response, invalidate_cache, invalidate_tags
+from backend.utils.cache_warmer import schedule_warm_after_invalidation
+from backend.utils.snapshots import invalidate_quiz_content
+from sqlalchemy.orm import selectinload, joinedload
+from backend.models.search import search_ids, load_ranked, DEFAULT_SEARCH_LIMIT
 import os
 from datetime import datetime, timezone, timedelta
 
@@ -10,6 +16,16 @@ from datetime import datetime, timezone, timedelta
 IST = timezone(timedelta(hours=5, minutes=30))
 
 admin_bp = Blueprint('admin', __name__)
+admin_bp.after_request(schedule_warm_after_invalidation)
+
+def _quiz_ids_for_subject(subject_id):
+    return [quiz_id for (quiz_id,) in db.session.query(Quiz.id).join(Chapter).filter(Chapter.subject_id == subject_id)]
+
+def _invalidate_quizzes(quiz_ids):
+    """After a subject or chapter edit: its quiz snapshots, and the student catalog only if it lists any of them"""
+    invalidate_quiz_content(*quiz_ids)
+    if quiz_ids:
+        invalidate_tags('catalog')
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=100)
@@ -19,6 +35,7 @@ def admin_dashboard():
 
 @admin_bp.route('/create_subject', methods=['POST'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('subjects')
 def create_subject():
     data = request.json or {}
     name = data.get('name', '').strip()
@@ -44,29 +61,35 @@ def create_subject():
 
     return jsonify({'message': 'Subject created successfully'}), 201
 
+def _serialize_subject(subject):
+    return {
+        'id': subject.id,
+        'name': subject.name,
+        'description': subject.description,
+        'chapters': [
+            {
+                'id': chapter.id,
+                'name': chapter.name,
+                'description': chapter.description,
+                'question_count': sum(quiz.question_count for quiz in chapter.quizzes)
+            }
+            for chapter in subject.chapters
+        ]
+    }
+
 @admin_bp.route('/subjects', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=60)
+@cache_response(expire_time=300, tags=('subjects',))
 def get_subjects():
+    """
+    All subjects in name order, as the admin UI lists them. Keyset pages and
+    streams (?after_id=, ?limit=, ?stream=1) follow the id cursor instead.
+    """
     try:
-        subjects = Subject.query.order_by(Subject.name).all()
-        subjects_list = [
-            {
-                'id': subject.id,
-                'name': subject.name,
-                'description': subject.description,
-                'chapters': [
-                    {
-                        'id': chapter.id,
-                        'name': chapter.name,
-                        'description': chapter.description,
-                        'question_count': sum([quiz.question_count for quiz in chapter.quizzes])
-                    }
-                    for chapter in subject.chapters
-                ]
-            }
-            for subject in subjects
-        ]
-        return jsonify({'subjects': subjects_list}), 200
+        query = Subject.query.options(
+            selectinload(Subject.chapters).selectinload(Chapter.quizzes)
+        ).order_by(Subject.name)
+        return paginated_list_response('subjects', query, Subject.id, _serialize_subject)
     except Exception as e:
         return jsonify({'message': 'An error occurred while fetching subjects.'}), 500
 
@@ -83,6 +106,7 @@ def get_subject(subject_id):
 
 @admin_bp.route('/subject/<int:subject_id>', methods=['PUT'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('subjects')
 def update_subject(subject_id):
     subject = Subject.query.get_or_404(subject_id)
     data = request.json or {}
@@ -98,12 +122,14 @@ def update_subject(subject_id):
     subject.name = name
     subject.description = description
     db.session.commit()
+    _invalidate_quizzes(_quiz_ids_for_subject(subject_id))
     
     return jsonify({'message': 'Subject updated successfully'})
 
 
 @admin_bp.route('/subject/<int:subject_id>', methods=['DELETE'])
 @admin_secure_endpoint(rate_limit_requests=20)
+@invalidate_cache('subjects')
 def delete_subject(subject_id):
     
     subject = Subject.query.get(subject_id)
@@ -111,8 +137,10 @@ def delete_subject(subject_id):
         return jsonify({'message': f'Subject with ID {subject_id} not found'}), 404
 
     try:
+        quiz_ids = _quiz_ids_for_subject(subject_id)
         db.session.delete(subject)
         db.session.commit()
+        _invalidate_quizzes(quiz_ids)
         
         return jsonify({'message': 'Subject deleted successfully'}), 200
     except Exception as e:
@@ -122,6 +150,7 @@ def delete_subject(subject_id):
 
 @admin_bp.route('/subject/<int:subject_id>/chapters', methods=['POST'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('subjects')
 def create_chapter(subject_id):
     subject = Subject.query.get_or_404(subject_id)
     
@@ -157,6 +186,7 @@ def get_chapter(chapter_id):
 
 @admin_bp.route('/chapter/<int:chapter_id>', methods=['PUT'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('subjects')
 def update_chapter(chapter_id):
     chapter = Chapter.query.get_or_404(chapter_id)
     data = request.json or {}
@@ -175,11 +205,13 @@ def update_chapter(chapter_id):
     chapter.name = name
     chapter.description = description
     db.session.commit()
+    _invalidate_quizzes([quiz.id for quiz in chapter.quizzes])
     
     return jsonify({'message': 'Chapter updated successfully'})
 
 @admin_bp.route('/chapter/<int:chapter_id>', methods=['DELETE'])
 @admin_secure_endpoint(rate_limit_requests=20)
+@invalidate_cache('subjects')
 def delete_chapter(chapter_id):
     # Disable CSRF for this specific endpoint
     request.csrf_valid = True
@@ -187,8 +219,10 @@ def delete_chapter(chapter_id):
     chapter = Chapter.query.get_or_404(chapter_id)
     
     try:
+        quiz_ids = [quiz.id for quiz in chapter.quizzes]
         db.session.delete(chapter)
         db.session.commit()
+        _invalidate_quizzes(quiz_ids)
         return jsonify({'message': 'Chapter deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -196,56 +230,55 @@ def delete_chapter(chapter_id):
             return jsonify({'message': 'Cannot delete chapter: It has related quizzes or other data'}), 400
         return jsonify({'message': 'Failed to delete chapter', 'error': str(e)}), 500
 
+def _serialize_question(question):
+    return {
+        'id': question.id,
+        'title': question.title,
+        'question_statement': question.question_statement,
+        'option1': question.option1,
+        'option2': question.option2,
+        'option3': question.option3,
+        'option4': question.option4,
+        'correct_option': question.correct_option
+    }
+
+def _serialize_chapter(chapter):
+    return {
+        'id': chapter.id,
+        'name': chapter.name,
+        'description': chapter.description,
+        'subject': {
+            'id': chapter.subject.id,
+            'name': chapter.subject.name
+        } if chapter.subject else None,
+        'quizzes': [
+            {
+                'id': quiz.id,
+                'chapter_id': quiz.chapter_id,
+                'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
+                'time_duration': quiz.time_duration,
+                'remarks': quiz.remarks,
+                'question_count': quiz.question_count
+            }
+            for quiz in chapter.quizzes
+        ]
+    }
+
 @admin_bp.route('/chapters', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=60)
 def get_chapters():
     try:
-        chapters = Chapter.query.order_by(Chapter.id).all()
-        
-        chapters_list = []
-        for chapter in chapters:
-            
-            questions_list = []
-            for quiz in chapter.quizzes:
-                for question in quiz.questions:
-                    questions_list.append({
-                        'id': question.id,
-                        'title': question.title,
-                        'question_statement': question.question_statement,
-                        'option1': question.option1,
-                        'option2': question.option2,
-                        'option3': question.option3,
-                        'option4': question.option4,
-                        'correct_option': question.correct_option
-                    })
-            
-            chapters_list.append({
-                'id': chapter.id,
-                'name': chapter.name,
-                'description': chapter.description,
-                'subject': {
-                    'id': chapter.subject.id,
-                    'name': chapter.subject.name
-                } if chapter.subject else None,
-                'quizzes': [
-                    {
-                        'id': quiz.id,
-                        'chapter_id': quiz.chapter_id,
-                        'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
-                        'time_duration': quiz.time_duration,
-                        'remarks': quiz.remarks,
-                        'question_count': quiz.question_count
-                    }
-                    for quiz in chapter.quizzes
-                ]
-            })
-        
-        return jsonify({'chapters': chapters_list}), 200
+        query = Chapter.query.options(
+            selectinload(Chapter.subject),
+            selectinload(Chapter.quizzes)
+        ).order_by(Chapter.id)
+        return paginated_list_response('chapters', query, Chapter.id, _serialize_chapter)
     except Exception as e:
         return jsonify({'message': 'An error occurred while fetching chapters.'}), 500
 
 @admin_bp.route('/quiz', methods=['POST'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('catalog')
 def create_quiz():
     try:
         data = request.get_json()
@@ -317,6 +350,7 @@ def get_quiz(quiz_id):
 
 @admin_bp.route('/quiz/<int:quiz_id>', methods=['PUT'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('catalog')
 def update_quiz(quiz_id):
     try:
         quiz = Quiz.query.get_or_404(quiz_id)
@@ -343,6 +377,7 @@ def update_quiz(quiz_id):
             quiz.time_duration = f"{duration_hours:02d}:{duration_minutes:02d}"
         
         db.session.commit()
+        invalidate_quiz_content(quiz_id)
         return jsonify({'message': 'Quiz updated successfully'}), 200
         
     except Exception as e:
@@ -351,56 +386,46 @@ def update_quiz(quiz_id):
 
 @admin_bp.route('/quiz/<int:quiz_id>', methods=['DELETE'])
 @admin_secure_endpoint(rate_limit_requests=20)
+@invalidate_cache('catalog', 'subjects')
 def delete_quiz(quiz_id):
     try:
         quiz = Quiz.query.get_or_404(quiz_id)
         
         db.session.delete(quiz)
         db.session.commit()
+        invalidate_quiz_content(quiz_id)
         return jsonify({'message': 'Quiz deleted successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Failed to delete quiz', 'error': str(e)}), 500
 
+def _serialize_quiz(quiz):
+    return {
+        'id': quiz.id,
+        'chapter_id': quiz.chapter_id,
+        'chapter_name': quiz.chapter.name if quiz.chapter else 'Unknown Chapter',
+        'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
+        'time_duration': quiz.time_duration,
+        'remarks': quiz.remarks,
+        'questions': [_serialize_question(question) for question in quiz.questions]
+    }
+
 @admin_bp.route('/quizzes', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=60)
 def get_all_quizzes():
     try:
-        quizzes = Quiz.query.order_by(Quiz.id).all()
-        
-        quizzes_list = []
-        for quiz in quizzes:
-            
-            questions_list = []
-            for question in quiz.questions:
-                questions_list.append({
-                    'id': question.id,
-                    'title': question.title,
-                    'question_statement': question.question_statement,
-                    'option1': question.option1,
-                    'option2': question.option2,
-                    'option3': question.option3,
-                    'option4': question.option4,
-                    'correct_option': question.correct_option
-                })
-            
-            quizzes_list.append({
-                'id': quiz.id,
-                'chapter_id': quiz.chapter_id,
-                'chapter_name': quiz.chapter.name if quiz.chapter else 'Unknown Chapter',
-                'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
-                'time_duration': quiz.time_duration,
-                'remarks': quiz.remarks,
-                'questions': questions_list
-            })
-        
-        return jsonify({'quizzes': quizzes_list}), 200
+        query = Quiz.query.options(
+            selectinload(Quiz.chapter),
+            selectinload(Quiz.questions)
+        ).order_by(Quiz.id)
+        return paginated_list_response('quizzes', query, Quiz.id, _serialize_quiz)
     except Exception as e:
         return jsonify({'message': 'An error occurred while fetching quizzes.'}), 500
 
 @admin_bp.route('/question', methods=['POST'])
 @admin_secure_endpoint(rate_limit_requests=30)
+@invalidate_cache('catalog', 'subjects')
 def create_question():
     try:
         data = request.get_json()
@@ -444,6 +469,7 @@ def create_question():
         
         db.session.add(new_question)
         db.session.commit()
+        invalidate_quiz_content(quiz_id)
         
         return jsonify({'message': 'Question created successfully', 'question_id': new_question.id}), 201
         
@@ -508,6 +534,7 @@ def update_question(question_id):
                 return jsonify({'message': 'Correct option must be a number between 1 and 4'}), 400
         
         db.session.commit()
+        invalidate_quiz_content(question.quiz_id)
         return jsonify({'message': 'Question updated successfully'}), 200
         
     except Exception as e:
@@ -516,54 +543,52 @@ def update_question(question_id):
 
 @admin_bp.route('/question/<int:question_id>', methods=['DELETE'])
 @admin_secure_endpoint(rate_limit_requests=20)
+@invalidate_cache('catalog', 'subjects')
 def delete_question(question_id):
     try:
         question = Question.query.get_or_404(question_id)
+        quiz_id = question.quiz_id
         
         db.session.delete(question)
         db.session.commit()
+        invalidate_quiz_content(quiz_id)
         return jsonify({'message': 'Question deleted successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Failed to delete question', 'error': str(e)}), 500
 
+def _serialize_user(user):
+    return {
+        'id': user.id,
+        'full_name': user.full_name,
+        'email': user.email,
+        'qualification': user.qualification,
+        'dob': user.dob.isoformat() if user.dob else None,
+        'is_admin': user.is_admin
+    }
+
 @admin_bp.route('/users', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=60)
 def get_users():
     try:
-        users = User.query.order_by(User.id).all()
-        users_list = [
-            {
-                'id': user.id,
-                'full_name': user.full_name,
-                'email': user.email,
-                'qualification': user.qualification,
-                'dob': user.dob.isoformat() if user.dob else None,
-                'is_admin': user.is_admin
-            }
-            for user in users
-        ]
-        return jsonify({'users': users_list}), 200
+        query = User.query.order_by(User.id)
+        return paginated_list_response('users', query, User.id, _serialize_user)
     except Exception as e:
         return jsonify({'message': 'An error occurred while fetching users.'}), 500
 
 @admin_bp.route('/search/users', methods=['GET'])
-@admin_secure_endpoint(rate_limit_requests=60)
+# Full-text queries cost more of the shared budget than plain reads
+@admin_secure_endpoint(rate_limit_requests=60, rate_limit_cost=2)
 def search_users():
     try:
         query = request.args.get('q', '').strip()
         if not query:
             return jsonify({'results': []}), 200
         
-        # Search in name, email, and qualification
-        users = User.query.filter(
-            db.or_(
-                User.full_name.ilike(f'%{query}%'),
-                User.email.ilike(f'%{query}%'),
-                User.qualification.ilike(f'%{query}%')
-            )
-        ).all()
+        # Ranked full-text match on name, email and qualification
+        limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+        users = load_ranked(User, search_ids('user', query, limit))
         
         results = []
         for user in users:
@@ -580,66 +605,79 @@ def search_users():
     except Exception as e:
         return jsonify({'message': 'An error occurred while searching users.'}), 500
 
+ADMIN_SUMMARY_CACHE_KEY = "cache:admin:summary"
+
+def _compute_admin_summary():
+    """Summary counts and per-subject score stats read from the subject rollup"""
+    from sqlalchemy import func, select
+    from backend.models.model import SubjectStats
+
+    total_users, total_quizzes, total_subjects, total_attempts = db.session.execute(
+        select(
+            select(func.count(User.id)).scalar_subquery(),
+            select(func.count(Quiz.id)).scalar_subquery(),
+            select(func.count(Subject.id)).scalar_subquery(),
+            select(func.coalesce(func.sum(SubjectStats.attempts), 0)).scalar_subquery()
+        )
+    ).one()
+
+    subject_rows = db.session.execute(
+        select(
+            Subject.name,
+            SubjectStats.max_score,
+            SubjectStats.min_score,
+            SubjectStats.score_sum * 1.0 / func.nullif(SubjectStats.scored_attempts, 0),
+            func.coalesce(SubjectStats.attempts, 0)
+        )
+        .select_from(Subject)
+        .outerjoin(SubjectStats, SubjectStats.subject_id == Subject.id)
+        .order_by(Subject.id)
+    ).all()
+
+    bar_chart_data = {
+        'subjects': [],
+        'max_scores': [],
+        'min_scores': [],
+        'avg_scores': []
+    }
+
+    pie_chart_data = {
+        'subjects': [],
+        'attempts': []
+    }
+
+    for name, max_score, min_score, avg_score, attempts in subject_rows:
+        # Subjects without attempts still show up with zero values
+        if not attempts or max_score is not None:
+            bar_chart_data['subjects'].append(name)
+            bar_chart_data['max_scores'].append(max_score or 0)
+            bar_chart_data['min_scores'].append(min_score or 0)
+            bar_chart_data['avg_scores'].append(round(float(avg_score), 2) if avg_score is not None else 0)
+
+        pie_chart_data['subjects'].append(name)
+        pie_chart_data['attempts'].append(attempts)
+
+    return {
+        'summary_stats': {
+            'totalUsers': total_users,
+            'totalQuizzes': total_quizzes,
+            'totalSubjects': total_subjects,
+            'totalAttempts': total_attempts
+        },
+        'bar_chart_data': bar_chart_data,
+        'pie_chart_data': pie_chart_data
+    }
+
 @admin_bp.route('/summary', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=60)
 def admin_summary():
     """Get admin summary data with charts and statistics"""
     try:
-        from sqlalchemy import func
-        
-        # Get basic statistics
-        total_users = User.query.count()
-        total_quizzes = Quiz.query.count()
-        total_subjects = Subject.query.count()
-        total_attempts = QuizResult.query.count()
-        
-        # Get subject-wise performance data for bar chart
-        subjects = Subject.query.all()
-        bar_chart_data = {
-            'subjects': [],
-            'max_scores': [],
-            'min_scores': []
-        }
-        
-        pie_chart_data = {
-            'subjects': [],
-            'attempts': []
-        }
-        
-        for subject in subjects:
-            # Get all quiz results for this subject
-            subject_results = db.session.query(QuizResult).join(Quiz).join(Chapter).filter(
-                Chapter.subject_id == subject.id
-            ).all()
-            
-            if subject_results:
-                scores = [result.score for result in subject_results if result.score is not None]
-                if scores:
-                    bar_chart_data['subjects'].append(subject.name)
-                    bar_chart_data['max_scores'].append(max(scores))
-                    bar_chart_data['min_scores'].append(min(scores))
-                
-                pie_chart_data['subjects'].append(subject.name)
-                pie_chart_data['attempts'].append(len(subject_results))
-            else:
-                # If no results, still show the subject with zero values
-                bar_chart_data['subjects'].append(subject.name)
-                bar_chart_data['max_scores'].append(0)
-                bar_chart_data['min_scores'].append(0)
-                
-                pie_chart_data['subjects'].append(subject.name)
-                pie_chart_data['attempts'].append(0)
-        
-        return jsonify({
-            'summary_stats': {
-                'totalUsers': total_users,
-                'totalQuizzes': total_quizzes,
-                'totalSubjects': total_subjects,
-                'totalAttempts': total_attempts
-            },
-            'bar_chart_data': bar_chart_data,
-            'pie_chart_data': pie_chart_data
-        }), 200
+        # Served from cache; refreshed in the background once older than 30s
+        summary = stale_while_revalidate(
+            ADMIN_SUMMARY_CACHE_KEY, _compute_admin_summary, fresh_for=30, stale_for=600
+        )
+        return jsonify(summary), 200
         
     except Exception as e:
         import traceback
@@ -647,20 +685,19 @@ def admin_summary():
         return jsonify({'message': 'An error occurred while getting summary data.'}), 500
 
 @admin_bp.route('/search/subjects', methods=['GET'])
-@admin_secure_endpoint(rate_limit_requests=60)
+@admin_secure_endpoint(rate_limit_requests=60, rate_limit_cost=2)
 def search_subjects():
     try:
         query = request.args.get('q', '').strip()
         if not query:
             return jsonify({'results': []}), 200
         
-        # Search in name and description
-        subjects = Subject.query.filter(
-            db.or_(
-                Subject.name.ilike(f'%{query}%'),
-                Subject.description.ilike(f'%{query}%')
-            )
-        ).all()
+        # Ranked full-text match on name and description
+        limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+        subjects = load_ranked(
+            Subject, search_ids('subject', query, limit),
+            selectinload(Subject.chapters).selectinload(Chapter.quizzes)
+        )
         
         results = []
         for subject in subjects:
@@ -693,21 +730,19 @@ def search_subjects():
         return jsonify({'message': 'An error occurred while searching subjects.'}), 500
 
 @admin_bp.route('/search/quizzes', methods=['GET'])
-@admin_secure_endpoint(rate_limit_requests=60)
+@admin_secure_endpoint(rate_limit_requests=60, rate_limit_cost=2)
 def search_quizzes():
     try:
         query = request.args.get('q', '').strip()
         if not query:
             return jsonify({'results': []}), 200
         
-        quizzes = Quiz.query.join(Chapter).join(Subject).filter(
-            db.or_(
-                Quiz.id.cast(db.String).ilike(f'%{query}%'),
-                Chapter.name.ilike(f'%{query}%'),
-                Subject.name.ilike(f'%{query}%'),
-                Quiz.date_of_quiz.cast(db.String).ilike(f'%{query}%')
-            )
-        ).all()
+        # Ranked full-text match on quiz id, date, remarks, chapter, subject and question titles
+        limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+        quizzes = load_ranked(
+            Quiz, search_ids('quiz', query, limit),
+            joinedload(Quiz.chapter).joinedload(Chapter.subject)
+        )
         
         results = []
         for quiz in quizzes:
@@ -2,17 +2,19 @@
 Cache Management API
 Provides endpoints for cache monitoring and management
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from backend.utils.decorators import admin_secure_endpoint
 from backend.utils.cache import (
     clear_all_cache, 
     get_cache_stats, 
-    warm_cache,
     get_redis_client
 )
+from backend.utils.cache_warmer import warm_cache
 from backend.utils.performance import (
     get_performance_stats,
+    get_latency_percentiles,
     get_slow_queries,
+    get_slow_statements,
     get_cache_performance
 )
 import redis
@@ -55,21 +57,13 @@ def clear_cache():
 @cache_bp.route('/warm', methods=['POST'])
 @admin_secure_endpoint(rate_limit_requests=10)
 def warm_cache_endpoint():
-    """Warm cache with frequently accessed data"""
+    """Render every endpoint in the warm manifest and the upcoming quiz snapshots into the cache"""
     try:
-        # Common cache patterns to warm
-        patterns = [
-            "cache:backend.api.admin.get_subjects*",
-            "cache:backend.api.user.get_quizzes*",
-            "cache:backend.api.admin.get_users*"
-        ]
-        
-        result = warm_cache(patterns)
+        result = warm_cache(current_app._get_current_object())
         return jsonify({
             'success': True,
-            'message': 'Cache warming initiated',
-            'warmed_keys': result.get('warmed_keys', 0),
-            'patterns': result.get('patterns', [])
+            'message': f"Warmed {result['warmed']} responses ({result['fresh']} still fresh) and {result['snapshots']} quiz snapshots",
+            **result
         }), 200
     except Exception as e:
         return jsonify({
@@ -156,7 +150,7 @@ def get_performance_metrics():
         # Get various performance metrics
         performance_stats = get_performance_stats(days)
         slow_queries = get_slow_queries(limit)
-        cache_performance = get_cache_performance()
+        cache_performance = get_cache_performance(days)
         
         return jsonify({
             'success': True,
@@ -180,7 +174,8 @@ def get_slow_queries_endpoint():
     """Get slowest API queries"""
     try:
         limit = request.args.get('limit', 10, type=int)
-        slow_queries = get_slow_queries(limit)
+        days = request.args.get('days', 1, type=int)
+        slow_queries = get_slow_queries(limit, days)
         
         return jsonify({
             'success': True,
@@ -196,18 +191,71 @@ def get_slow_queries_endpoint():
 @cache_bp.route('/performance/stats', methods=['GET'])
 @admin_secure_endpoint(rate_limit_requests=30)
 def get_performance_stats_endpoint():
-    """Get performance statistics"""
+    """Get performance statistics, with latency percentiles per day and over the whole window"""
     try:
         days = request.args.get('days', 7, type=int)
-        performance_stats = get_performance_stats(days)
+        endpoint = request.args.get('endpoint')
+        try:
+            percentiles = tuple(float(p) for p in request.args.get('percentiles', '50,95,99').split(','))
+        except ValueError:
+            percentiles = ()
+        if not percentiles or not all(0 < p <= 100 for p in percentiles):
+            return jsonify({
+                'success': False,
+                'error': 'percentiles must be a comma-separated list of numbers in (0, 100]'
+            }), 400
+        
+        performance_stats = get_performance_stats(days, percentiles)
+        latency = get_latency_percentiles(days, percentiles, endpoint)
         
         return jsonify({
             'success': True,
             'performance_stats': performance_stats,
+            'latency': latency,
+            'days_requested': days
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cache_bp.route('/performance/cache', methods=['GET'])
+@admin_secure_endpoint(rate_limit_requests=30)
+def get_cache_performance_endpoint():
+    """Get per-endpoint cache hit/miss/stale counts, recompute time and payload size"""
+    try:
+        days = request.args.get('days', 1, type=int)
+        cache_performance = get_cache_performance(days)
+        
+        return jsonify({
+            'success': True,
+            'cache_performance': cache_performance,
+            'days_requested': days
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cache_bp.route('/performance/sql', methods=['GET'])
+@admin_secure_endpoint(rate_limit_requests=30)
+def get_slow_statements_endpoint():
+    """Get the slowest SQL statements with their parameter shape, caller and query plan"""
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        days = request.args.get('days', 1, type=int)
+        statements = get_slow_statements(limit, days)
+        
+        return jsonify({
+            'success': True,
+            'slow_statements': statements,
+            'full_scans': sum(1 for statement in statements if statement.get('full_scan')),
             'days_requested': days
         }), 200
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
@@ -0,0 +1,32 @@
+"""
+Metrics Scrape API
+Serves /metrics in OpenMetrics text format for Prometheus-compatible scrapers
+"""
+import hmac
+from flask import Blueprint, Response, jsonify, request, current_app
+from redis.exceptions import RedisError
+from backend.utils.cache import rate_limit
+from backend.utils.openmetrics import render_metrics, CONTENT_TYPE
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def _scrape_allowed():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    # Without a token only a scraper on the same host may read the metrics
+    return request.remote_addr in LOOPBACK_ADDRESSES
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@rate_limit(requests_per_minute=30)
+def get_metrics():
+    """Metrics of all workers; requires 'Authorization: Bearer <METRICS_TOKEN>', or a loopback client when no token is set"""
+    if not _scrape_allowed():
+        return jsonify({'message': 'Unauthorized'}), 401
+    try:
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+    except RedisError as e:
+        current_app.logger.error(f"Failed to render metrics: {e}")
+        return jsonify({'message': 'Metrics store unavailable'}), 503
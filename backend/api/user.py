@@ -1,38 +1,31 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, abort
 from flask_login import login_required, current_user
 from backend.models.model import Quiz, Chapter, Subject, QuizResult
 from datetime import datetime
 from flask import request
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from backend.extensions import db
 from backend.utils.decorators import secure_endpoint, user_context_middleware
+from backend.utils.catalog import load_quiz_catalog
+from backend.utils.grading import get_answer_key, grade_answers
+from backend.utils.snapshots import get_quiz_snapshot, snapshot_response
+from backend.utils.cache import cache_user_specific, invalidate_tags
+from backend.models.search import search_ids, load_ranked, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
 import os
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/quizzes', methods=['GET'])
 @secure_endpoint(rate_limit_requests=60)
+@cache_user_specific(expire_time=300, tags=('catalog',))
 def get_user_quizzes():
     try:
-        # Get all quizzes (no date filter)
-        quizzes = Quiz.query.order_by(Quiz.date_of_quiz).all()
-        quizzes_list = []
-        for quiz in quizzes:
-            quizzes_list.append({
-                'id': quiz.id,
-                'questions': [{'id': q.id} for q in quiz.questions],
-                'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
-                'time_duration': quiz.time_duration,
-                'chapter': {
-                    'id': quiz.chapter.id,
-                    'name': quiz.chapter.name,
-                    'subject': {
-                        'id': quiz.chapter.subject.id,
-                        'name': quiz.chapter.subject.name
-                    } if quiz.chapter and quiz.chapter.subject else None
-                } if quiz.chapter else None
-            })
+        # Get all quizzes (no date filter) with chapter, subject and question ids preloaded
+        quizzes_list = load_quiz_catalog()
         # Get quiz IDs already taken by the user
-        taken_quiz_ids = [result.quiz_id for result in QuizResult.query.filter_by(user_id=current_user.id).all()]
+        taken_quiz_ids = [quiz_id for (quiz_id,) in db.session.query(QuizResult.quiz_id).filter_by(user_id=current_user.id)]
         return jsonify({'all_quizzes': quizzes_list, 'taken_quiz_ids': taken_quiz_ids}), 200
     except Exception as e:
         return jsonify({'message': 'An error occurred while fetching quizzes.'}), 500
@@ -40,54 +33,43 @@ def get_user_quizzes():
 @user_bp.route('/quiz/<int:quiz_id>', methods=['GET'])
 @secure_endpoint(rate_limit_requests=60)
 def get_quiz_for_user(quiz_id):
-    from backend.models.model import Quiz
-    quiz = Quiz.query.get_or_404(quiz_id)
-    quiz_data = {
-        'id': quiz.id,
-        'chapter_id': quiz.chapter_id,
-        'chapter': {
-            'id': quiz.chapter.id,
-            'name': quiz.chapter.name,
-            'subject': {
-                'id': quiz.chapter.subject.id,
-                'name': quiz.chapter.subject.name
-            } if quiz.chapter and quiz.chapter.subject else None
-        } if quiz.chapter else None,
-        'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
-        'time_duration': quiz.time_duration,
-        'remarks': quiz.remarks,
-        'questions': [
-            {
-                'id': q.id,
-                'title': q.title,
-                'question_statement': q.question_statement,
-                'option1': q.option1,
-                'option2': q.option2,
-                'option3': q.option3,
-                'option4': q.option4,
-                'correct_option': q.correct_option
-            } for q in quiz.questions
-        ]
-    }
-    return jsonify({'quiz': quiz_data}), 200
+    # One serialization per quiz content version, shared by every student
+    snapshot = get_quiz_snapshot(quiz_id, request.if_none_match)
+    if snapshot is None:
+        abort(404)
+    return snapshot_response(snapshot)
 
 @user_bp.route('/quiz/<int:quiz_id>/submit', methods=['POST'])
 @secure_endpoint(rate_limit_requests=10)
 def submit_quiz_result(quiz_id):
-    from backend.models.model import QuizResult, Quiz
-    # Prevent multiple attempts
-    existing = QuizResult.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
-    if existing:
-        return jsonify({'message': 'Quiz already submitted'}), 400
-    data = request.get_json()
-    score = data.get('score')
-    if score is None:
-        return jsonify({'message': 'Score is required'}), 400
+    from backend.models.model import QuizResult, Quiz, UserAnswer
+    data = request.get_json() or {}
+    answers = data.get('answers')
+    # Always graded server side; a client supplied score is never stored
+    if not isinstance(answers, dict):
+        return jsonify({'message': 'Answers must map question ids to options'}), 400
     quiz = Quiz.query.get_or_404(quiz_id)
+    try:
+        score, answer_rows = grade_answers(get_answer_key(quiz_id), answers)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     result = QuizResult(user_id=current_user.id, quiz_id=quiz_id, score=score)
     from backend.extensions import db
     db.session.add(result)
-    db.session.commit()
+    try:
+        db.session.flush()
+        if answer_rows:
+            # One executemany for all answers, in the same transaction as the result
+            db.session.execute(
+                insert(UserAnswer.__table__),
+                [dict(row, quiz_result_id=result.id) for row in answer_rows]
+            )
+        db.session.commit()
+    except IntegrityError:
+        # Prevent multiple attempts: unique (user_id, quiz_id) on quiz_result
+        db.session.rollback()
+        return jsonify({'message': 'Quiz already submitted'}), 400
+    invalidate_tags(f'user:{current_user.id}')
     return jsonify({'message': 'Quiz submitted', 'score': score}), 200
 
 @user_bp.route('/scores', methods=['GET'])
@@ -125,22 +107,27 @@ def get_user_scores():
 @user_bp.route('/summary', methods=['GET'])
 @secure_endpoint(rate_limit_requests=60)
 def user_summary():
-    from backend.models.model import QuizResult
+    from backend.models.model import UserSubjectStats, UserMonthStats
+    from calendar import month_name
     from collections import defaultdict
-    # Subject-wise attempts
+    # Subject-wise attempts, read from the per-user rollup
+    subject_rows = db.session.query(Subject.name, UserSubjectStats.attempts).join(
+        Subject, UserSubjectStats.subject_id == Subject.id
+    ).filter(
+        UserSubjectStats.user_id == current_user.id
+    ).order_by(Subject.id).all()
     subject_counts = defaultdict(int)
-    results = QuizResult.query.filter_by(user_id=current_user.id).all()
-    for r in results:
-        if r.quiz and r.quiz.chapter and r.quiz.chapter.subject:
-            subject_counts[r.quiz.chapter.subject.name] += 1
+    for name, attempts in subject_rows:
+        subject_counts[name] += attempts
     subjects = list(subject_counts.keys())
     attempt_counts = [subject_counts[s] for s in subjects]
     # Month-wise attempts
+    month_rows = UserMonthStats.query.filter_by(user_id=current_user.id).order_by(
+        UserMonthStats.year, UserMonthStats.month
+    ).all()
     month_counts = defaultdict(int)
-    for r in results:
-        if r.date_taken:
-            month = r.date_taken.strftime('%B')
-            month_counts[month] += 1
+    for row in month_rows:
+        month_counts[month_name[row.month]] += row.attempts
     months = list(month_counts.keys())
     attempts = [month_counts[m] for m in months]
     return jsonify({
@@ -152,16 +139,31 @@ def user_summary():
 @login_required
 def user_search():
     query = request.args.get('q', '').strip().lower()
+    limit = request.args.get('limit', type=int)
     from backend.models.model import Quiz, Subject, QuizResult, Chapter
     results = []
     quiz_results = {}
 
-    # Find quizzes matching query - use correct relationship syntax
-    quiz_objs = Quiz.query.join(Chapter).join(Subject).filter(
-        (Quiz.id.cast(db.String).ilike(f'%{query}%')) |
-        (Chapter.name.ilike(f'%{query}%')) |
-        (Subject.name.ilike(f'%{query}%'))
-    ).all()
+    if query:
+        # Find quizzes and subjects matching query (quiz documents include chapter and subject names)
+        quiz_objs = load_ranked(
+            Quiz, search_ids('quiz', query, limit or DEFAULT_SEARCH_LIMIT),
+            joinedload(Quiz.chapter).joinedload(Chapter.subject)
+        )
+        subject_objs = load_ranked(
+            Subject, search_ids('subject', query, limit or DEFAULT_SEARCH_LIMIT),
+            selectinload(Subject.chapters).selectinload(Chapter.quizzes)
+        )
+    else:
+        # An empty query lists every quiz and subject, as before the search index
+        # (capped only when ?limit= is given)
+        browse_limit = max(1, min(limit, MAX_SEARCH_LIMIT)) if limit else None
+        quiz_objs = Quiz.query.join(Chapter).join(Subject).options(
+            contains_eager(Quiz.chapter).contains_eager(Chapter.subject)
+        ).order_by(Quiz.id).limit(browse_limit).all()
+        subject_objs = Subject.query.options(
+            selectinload(Subject.chapters).selectinload(Chapter.quizzes)
+        ).order_by(Subject.id).limit(browse_limit).all()
     
     for quiz in quiz_objs:
         # Access subject through the chapter relationship
@@ -182,8 +184,6 @@ def user_search():
             } if quiz.chapter else None
         })
 
-    # Find subjects matching query
-    subject_objs = Subject.query.filter(Subject.name.ilike(f'%{query}%')).all()
     for subject in subject_objs:
         chapters = []
         for chapter in subject.chapters:
@@ -210,9 +210,9 @@ def user_search():
         })
 
     # Quiz results for this user
-    user_results = QuizResult.query.filter_by(user_id=current_user.id).all()
-    for r in user_results:
-        quiz_results[r.quiz_id] = r.score
+    user_results = db.session.query(QuizResult.quiz_id, QuizResult.score).filter_by(user_id=current_user.id)
+    for quiz_id, score in user_results:
+        quiz_results[quiz_id] = score
 
     return jsonify({
         'results': results,
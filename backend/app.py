@@ -8,11 +8,18 @@ from backend.models.model import User
 from backend.api.auth import auth_bp
 from backend.api.admin import admin_bp
 from backend.api.user import user_bp
+from backend.api.cache import cache_bp
+from backend.api.metrics import metrics_bp
 from backend.config import Config
 from werkzeug.security import generate_password_hash
 from datetime import date, timezone, timedelta
 from flask_wtf.csrf import CSRFError
 from backend.utils.performance import performance_middleware
+from backend.models.schema import upgrade_schema, MigrationError
+from backend.utils.database import configure_database, register_engine_events
+from backend.utils.query_metrics import register_query_metrics
+from backend.utils.openmetrics import register_pool_gauges
+from backend.commands import register_commands
 import os
 from backend.celery_app import create_celery
 
@@ -57,15 +64,25 @@ def create_app():
     def handle_400_error(e):
         return jsonify({'message': 'Bad request'}), 400
     
+    configure_database(app)
     db.init_app(app)
     login_manager.init_app(app)
     
+    register_pool_gauges(app)
     before_request, after_request = performance_middleware()
     app.before_request(before_request)
     app.after_request(after_request)
 
     with app.app_context():
+        register_engine_events(app, db.engine)
+        register_query_metrics(db.engine)
         db.create_all()
+        try:
+            upgrade_schema()
+        except MigrationError as e:
+            # The other migrations have run; only the blocked one waits for the data to be
+            # repaired with the CLI and is retried on the next start
+            app.logger.error(f"Schema upgrade blocked: {e}")
         if not User.query.filter_by(is_admin=True).first():
             admin_user = User(
                 email="admin@quizmaster.com",
@@ -86,9 +103,13 @@ def create_app():
     def get_csrf_token():
         return jsonify({'csrf_token': generate_csrf()})
 
+    register_commands(app)
+
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(cache_bp, url_prefix='/api/cache')
+    app.register_blueprint(metrics_bp)
 
     @app.route('/ping')
     def ping():
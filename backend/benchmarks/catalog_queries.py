@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Catalog Query Count Check
+Loads the quiz catalog (load_quiz_catalog, behind GET /api/user/quizzes) from
+in-memory SQLite datasets of growing size and counts the SQL statements it runs.
+The count must stay the same at every size; a count that grows with the catalog
+is an N+1 regression and makes the script exit with status 1.
+
+    python -m backend.benchmarks.catalog_queries --sizes 1 10 100 --max-queries 2
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from datetime import date
+from flask import Flask
+from sqlalchemy import event
+from backend.extensions import db
+import backend.models.model  # noqa: F401  (registers tables on db.metadata)
+from backend.utils.catalog import load_quiz_catalog
+from backend.utils.query_metrics import statement_fingerprint
+
+CATALOG_QUERY_BUDGET = 2
+
+def populate(quizzes, chapters=5, questions_per_quiz=5):
+    tables = db.metadata.tables
+    db.session.execute(tables['subject'].insert(), [{'id': 1, 'name': 'Subject', 'description': ''}])
+    db.session.execute(tables['chapter'].insert(), [
+        {'id': i, 'name': f'Chapter {i}', 'description': '', 'subject_id': 1} for i in range(1, chapters + 1)
+    ])
+    db.session.execute(tables['quiz'].insert(), [
+        {'id': i, 'chapter_id': i % chapters + 1, 'date_of_quiz': date(2030, 1, 1), 'time_duration': '00:30',
+         'remarks': '', 'question_count': questions_per_quiz}
+        for i in range(1, quizzes + 1)
+    ])
+    db.session.execute(tables['question'].insert(), [
+        {'quiz_id': quiz_id, 'title': f'Q{n}', 'question_statement': '', 'correct_option': 1}
+        for quiz_id in range(1, quizzes + 1) for n in range(questions_per_quiz)
+    ])
+    db.session.commit()
+
+def count_catalog_queries(quizzes):
+    """(statements by fingerprint, catalog length, elapsed ms) for one catalog load over a fresh dataset"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        populate(quizzes)
+        db.session.expunge_all()
+
+        statements = Counter()
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements[statement_fingerprint(statement)] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            started = time.perf_counter()
+            catalog = load_quiz_catalog()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        db.session.remove()
+        db.drop_all()
+    return statements, len(catalog), elapsed_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--max-queries', type=int, default=CATALOG_QUERY_BUDGET)
+    args = parser.parse_args()
+
+    counts = {}
+    for size in args.sizes:
+        statements, loaded, elapsed_ms = count_catalog_queries(size)
+        counts[size] = sum(statements.values())
+        print(f'{size} quizzes: {counts[size]} queries, {loaded} loaded, {elapsed_ms:.2f} ms')
+        for fingerprint, count in statements.most_common():
+            print(f'    {count} x {fingerprint}')
+
+    if len(set(counts.values())) > 1 or max(counts.values()) > args.max_queries:
+        print(f'FAIL: catalog queries must stay at most {args.max_queries} at every size, got {counts}')
+        return 1
+    print(f'OK: {max(counts.values())} queries at every size')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
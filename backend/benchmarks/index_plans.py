@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Index Benchmark
+Builds a synthetic SQLite dataset and prints query plans and timings for the hot
+lookup paths without and then with the hot path indexes.
+
+    python -m backend.benchmarks.index_plans --users 20000 --results 400000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from backend.extensions import db
+import backend.models.model  # noqa: F401  (registers tables on db.metadata)
+from backend.models.schema import hot_path_indexes
+
+HOT_QUERIES = [
+    (
+        'duplicate submission check',
+        "SELECT id FROM quiz_result WHERE user_id = :user_id AND quiz_id = :quiz_id",
+    ),
+    (
+        'user score history',
+        "SELECT quiz_result.id, quiz_result.score, chapter.name, subject.name FROM quiz_result "
+        "JOIN quiz ON quiz_result.quiz_id = quiz.id "
+        "JOIN chapter ON quiz.chapter_id = chapter.id "
+        "JOIN subject ON chapter.subject_id = subject.id "
+        "WHERE quiz_result.user_id = :user_id ORDER BY quiz_result.date_taken DESC",
+    ),
+    (
+        'daily reminder candidates',
+        "SELECT user.id FROM user WHERE user.id NOT IN "
+        "(SELECT quiz_result.user_id FROM quiz_result WHERE quiz_result.date_taken >= :since)",
+    ),
+    (
+        'chapters of a subject',
+        "SELECT id, name FROM chapter WHERE subject_id = :subject_id",
+    ),
+    (
+        'questions of a quiz',
+        "SELECT id, title FROM question WHERE quiz_id = :quiz_id",
+    ),
+]
+
+def populate(engine, users, subjects, quizzes, questions_per_quiz, results):
+    rng = random.Random(42)
+    now = datetime.now()
+    chapters = subjects * 10
+    with engine.begin() as connection:
+        connection.execute(db.metadata.tables['subject'].insert(), [
+            {'id': i, 'name': f'Subject {i}', 'description': ''} for i in range(1, subjects + 1)
+        ])
+        connection.execute(db.metadata.tables['chapter'].insert(), [
+            {'id': i, 'name': f'Chapter {i}', 'description': '', 'subject_id': rng.randint(1, subjects)}
+            for i in range(1, chapters + 1)
+        ])
+        connection.execute(db.metadata.tables['quiz'].insert(), [
+            {'id': i, 'chapter_id': rng.randint(1, chapters), 'date_of_quiz': (now + timedelta(days=rng.randint(-200, 30))).date(),
+             'time_duration': '00:30', 'remarks': '', 'question_count': questions_per_quiz}
+            for i in range(1, quizzes + 1)
+        ])
+        connection.execute(db.metadata.tables['question'].insert(), [
+            {'quiz_id': quiz_id, 'title': f'Q{n}', 'question_statement': '', 'correct_option': 1}
+            for quiz_id in range(1, quizzes + 1) for n in range(questions_per_quiz)
+        ])
+        connection.execute(db.metadata.tables['user'].insert(), [
+            {'id': i, 'email': f'user{i}@example.com', 'password': 'x', 'is_admin': False}
+            for i in range(1, users + 1)
+        ])
+        pairs = set()
+        while len(pairs) < results:
+            pairs.add((rng.randint(1, users), rng.randint(1, quizzes)))
+        connection.execute(db.metadata.tables['quiz_result'].insert(), [
+            {'user_id': user_id, 'quiz_id': quiz_id, 'score': rng.randint(0, 100),
+             'date_taken': now - timedelta(minutes=rng.randint(0, 60 * 24 * 120))}
+            for user_id, quiz_id in pairs
+        ])
+
+def measure(engine, params, repeat):
+    report = []
+    with engine.connect() as connection:
+        for label, sql in HOT_QUERIES:
+            plan = [row[-1] for row in connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params)]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(text(sql), params).fetchall()
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            report.append((label, plan, elapsed_ms))
+    return report
+
+def print_report(title, report):
+    print(f'\n=== {title} ===')
+    for label, plan, elapsed_ms in report:
+        print(f'{label}: {elapsed_ms:.3f} ms')
+        for step in plan:
+            print(f'    {step}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--quizzes', type=int, default=2000)
+    parser.add_argument('--questions-per-quiz', type=int, default=10)
+    parser.add_argument('--results', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            for index in hot_path_indexes():
+                index.drop(connection, checkfirst=True)
+
+        populate(engine, args.users, args.subjects, args.quizzes, args.questions_per_quiz, args.results)
+        params = {
+            'user_id': args.users // 2,
+            'quiz_id': args.quizzes // 2,
+            'subject_id': max(1, args.subjects // 2),
+            'since': datetime.now() - timedelta(days=7),
+        }
+
+        with engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+        before = measure(engine, params, args.repeat)
+
+        with engine.begin() as connection:
+            for index in hot_path_indexes():
+                index.create(connection, checkfirst=True)
+            connection.execute(text('ANALYZE'))
+        after = measure(engine, params, args.repeat)
+
+        print_report('without hot path indexes', before)
+        print_report('with hot path indexes', after)
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Redis Latency Benchmark
+Starts a stand-in Redis on a local port that either forwards to a real Redis with
+injected latency, or accepts connections and never answers (--upstream none, a
+hung server). The app is pointed at it and cached, rate-limited requests are
+timed through the test client, reporting latency percentiles and the circuit
+breaker state.
+
+    python -m backend.benchmarks.redis_outage --upstream localhost:6379 --latency-ms 50
+    python -m backend.benchmarks.redis_outage --upstream none --requests 200
+"""
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+
+class LatencyProxy:
+    """TCP stand-in for Redis: delays every chunk sent upstream, or swallows everything"""
+
+    def __init__(self, upstream=None, latency=0.0):
+        self.upstream = upstream
+        self.latency = latency
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(128)
+        self.port = self.server.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            client, _ = self.server.accept()
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        if self.upstream is None:
+            # Hung server: read requests, never reply
+            while client.recv(65536):
+                pass
+            return
+        upstream = socket.create_connection(self.upstream)
+        threading.Thread(target=self._pump, args=(upstream, client, 0), daemon=True).start()
+        self._pump(client, upstream, self.latency)
+
+    @staticmethod
+    def _pump(source, target, delay):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if delay:
+                    time.sleep(delay)
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            source.close()
+            target.close()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--upstream', default='localhost:6379', help="host:port of a real Redis, or 'none' for a hung server")
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--path', default='/api/admin/subjects')
+    args = parser.parse_args()
+
+    upstream = None
+    if args.upstream != 'none':
+        host, _, port = args.upstream.partition(':')
+        upstream = (host, int(port or 6379))
+    proxy = LatencyProxy(upstream, args.latency_ms / 1000).start()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    # The Redis clients read their settings at import, so configure before importing the app
+    os.environ['REDIS_URL'] = f'redis://127.0.0.1:{proxy.port}/0'
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from backend.app import create_app
+    from backend.utils.cache import redis_breaker, rate_limit_counters
+
+    try:
+        app = create_app()
+        client = app.test_client()
+        client.post('/api/auth/login', json={'email': 'admin@quizmaster.com', 'password': 'admin123'})
+
+        timings, statuses = [], {}
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(args.path)
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        print(f"{args.requests} x GET {args.path} via stand-in Redis "
+              f"(upstream={args.upstream}, latency={args.latency_ms} ms)")
+        print(f"  p50 {percentile(timings, 0.5):8.2f} ms   p95 {percentile(timings, 0.95):8.2f} ms   "
+              f"max {max(timings):8.2f} ms   total {sum(timings):9.1f} ms")
+        print(f"  status codes: {statuses}")
+        print(f"  circuit breaker: {redis_breaker.snapshot()}")
+        print(f"  rate limiter: {rate_limit_counters}")
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
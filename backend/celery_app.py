@@ -21,6 +21,7 @@ def create_celery(app):
             'backend.tasks.monthly_performance_reports': {'queue': 'reports'},
             'backend.tasks.send_email': {'queue': 'notifications'},
             'backend.tasks.send_gchat_notification': {'queue': 'notifications'},
+            'backend.tasks.rebuild_analytics_rollups': {'queue': 'reports'},
         },
         
         # Task execution settings
@@ -59,6 +60,16 @@ def create_celery(app):
                 'schedule': crontab(day_of_month=1, hour=9, minute=0),  # 1st of month at 9 AM
                 'options': {'queue': 'reports'}
             },
+            'nightly-rollup-rebuild': {
+                'task': 'backend.tasks.rebuild_analytics_rollups',
+                'schedule': crontab(hour=2, minute=30),  # Daily at 2:30 AM
+                'options': {'queue': 'reports'}
+            },
+            'response-cache-warm': {
+                'task': 'backend.tasks.warm_response_cache',
+                'schedule': crontab(minute='*/4'),  # inside the default 5 minute cache TTL
+                'options': {'queue': 'default'}
+            },
         },
         
         # Queue settings
@@ -0,0 +1,87 @@
+"""
+Flask CLI Commands
+Database maintenance commands, run with `flask --app backend.app <command>`
+"""
+import json
+import click
+from backend.models.schema import upgrade_schema, MigrationError, find_duplicate_quiz_results, delete_duplicate_quiz_results
+from backend.models.counters import find_question_count_drift, repair_question_counts
+from backend.extensions import db
+
+def register_commands(app):
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Apply pending schema migrations"""
+        try:
+            applied = upgrade_schema()
+        except MigrationError as e:
+            for step in e.applied:
+                click.echo(f"Applied migration {step['version']}: {step['description']}")
+            raise click.ClickException(str(e))
+        if not applied:
+            click.echo('Schema is up to date')
+        for step in applied:
+            click.echo(f"Applied migration {step['version']}: {step['description']}")
+
+    @app.cli.command('dedupe-quiz-results')
+    @click.option('--dry-run', is_flag=True, help='Only list the repeat submissions')
+    @click.option('--export', type=click.Path(dir_okay=False, writable=True),
+                  help='Write the results that are deleted (with their answers) to this JSON file first')
+    def dedupe_quiz_results_command(dry_run, export):
+        """Delete repeat submissions of a quiz, keeping each user's first attempt"""
+        from sqlalchemy import text
+        with db.engine.begin() as connection:
+            duplicates = find_duplicate_quiz_results(connection)
+            for row in duplicates:
+                click.echo(f"quiz_result {row['id']}: user {row['user_id']}, quiz {row['quiz_id']}, "
+                           f"score {row['score']}, taken {row['date_taken']}, {row['answers']} answer(s)")
+            click.echo(f"{len(duplicates)} repeat submission(s), "
+                       f"{sum(row['answers'] for row in duplicates)} answer row(s)")
+            if dry_run or not duplicates:
+                return
+            if export:
+                for row in duplicates:
+                    row['user_answers'] = [dict(answer._mapping) for answer in connection.execute(
+                        text("SELECT * FROM user_answer WHERE quiz_result_id = :id"), {'id': row['id']}
+                    )]
+                with open(export, 'w') as f:
+                    json.dump(duplicates, f, indent=2, default=str)
+                click.echo(f'Exported to {export}')
+            delete_duplicate_quiz_results(connection)
+            click.echo(f'Deleted {len(duplicates)} repeat submission(s)')
+        for step in upgrade_schema():
+            click.echo(f"Applied migration {step['version']}: {step['description']}")
+
+    @app.cli.command('check-question-counts')
+    def check_question_counts_command():
+        """Report quizzes whose stored question_count has drifted"""
+        drift = find_question_count_drift()
+        for row in drift:
+            click.echo(f"Quiz {row['quiz_id']}: stored {row['stored']}, actual {row['actual']}")
+        click.echo(f'{len(drift)} quiz(zes) with inconsistent question_count')
+        if drift:
+            raise SystemExit(1)
+
+    @app.cli.command('repair-question-counts')
+    def repair_question_counts_command():
+        """Recompute stored question_count for every quiz"""
+        drift = repair_question_counts()
+        click.echo(f'Repaired question_count on {len(drift)} quiz(zes)')
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the analytics rollup tables from quiz_result"""
+        from backend.models.rollups import rebuild_rollups
+        with db.engine.begin() as connection:
+            written = rebuild_rollups(connection)
+        for table, rows in written.items():
+            click.echo(f'{table}: {rows} row(s)')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Rebuild the full-text search index from the catalog and user tables"""
+        from backend.models.search import rebuild_search_index
+        with db.engine.begin() as connection:
+            written = rebuild_search_index(connection)
+        for kind, documents in written.items():
+            click.echo(f'{kind}: {documents} document(s)')
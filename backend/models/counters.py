@@ -0,0 +1,40 @@
+"""
+Denormalized Counter Maintenance
+Consistency checks and repair for Quiz.question_count
+"""
+from sqlalchemy import func, select, text
+from backend.extensions import db
+from backend.models.model import Quiz, Question
+
+REPAIR_QUESTION_COUNTS_SQL = text(
+    "UPDATE quiz SET question_count = "
+    "(SELECT COUNT(question.id) FROM question WHERE question.quiz_id = quiz.id)"
+)
+
+def find_question_count_drift():
+    """Return quizzes whose stored question_count differs from the real number of questions"""
+    actual = (
+        select(Question.quiz_id, func.count(Question.id).label('actual'))
+        .group_by(Question.quiz_id)
+        .subquery()
+    )
+    actual_count = func.coalesce(actual.c.actual, 0)
+    rows = db.session.execute(
+        select(Quiz.id, Quiz.question_count, actual_count)
+        .outerjoin(actual, actual.c.quiz_id == Quiz.id)
+        .where(Quiz.question_count != actual_count)
+        .order_by(Quiz.id)
+    ).all()
+    return [
+        {'quiz_id': quiz_id, 'stored': stored, 'actual': actual_value}
+        for quiz_id, stored, actual_value in rows
+    ]
+
+def repair_question_counts():
+    """Recompute every stored question_count from the question table; returns the drift that was fixed"""
+    drift = find_question_count_drift()
+    if drift:
+        db.session.execute(REPAIR_QUESTION_COUNTS_SQL)
+        db.session.commit()
+        db.session.expire_all()
+    return drift
@@ -1,5 +1,4 @@
-from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import select, func
+from sqlalchemy import event, update
 from datetime import datetime, timezone, timedelta
 from flask_login import UserMixin
 from backend.extensions import db
@@ -19,28 +18,24 @@ class Chapter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False, index=True)
     quizzes = db.relationship('Quiz', backref='chapter', cascade='all,delete-orphan')
 
 # 3. Quiz (depends on Chapter)
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id',ondelete='CASCADE'), nullable=False)
-    date_of_quiz = db.Column(db.Date)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id',ondelete='CASCADE'), nullable=False, index=True)
+    date_of_quiz = db.Column(db.Date, index=True)
     time_duration = db.Column(db.String(5))  # HH:MM format
     remarks = db.Column(db.Text)
+    # Denormalized count of questions, maintained by the Question mapper events below
+    question_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     questions = db.relationship('Question', cascade='all, delete-orphan', backref='quiz', lazy='select')
-    @hybrid_property
-    def question_count(self):
-        return len(self.questions)
-    @question_count.expression
-    def question_count(cls):
-        return select([func.count(Question.id)]).where(Question.quiz_id == cls.id).label("question_count")
 
 # 4. Question (depends on Quiz)
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id',ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id',ondelete='CASCADE'), nullable=False, index=True)
     title = db.Column(db.String(200), nullable=False)
     question_statement = db.Column(db.Text, nullable=False)
     option1 = db.Column(db.String(200))
@@ -72,15 +67,94 @@ class Score(db.Model):
 
 class UserAnswer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_result_id = db.Column(db.Integer, db.ForeignKey('quiz_result.id'), nullable=False)
+    quiz_result_id = db.Column(db.Integer, db.ForeignKey('quiz_result.id'), nullable=False, index=True)
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
     user_answer = db.Column(db.String(1))  # Assuming multiple choice answers A, B, C, D
     is_correct = db.Column(db.Boolean)
 class QuizResult(db.Model):
+    __table_args__ = (
+        # One attempt per user per quiz; also serves every user_id lookup
+        db.Index('uq_quiz_result_user_quiz', 'user_id', 'quiz_id', unique=True),
+        # Score history ordered by date for one user
+        db.Index('ix_quiz_result_user_date', 'user_id', 'date_taken'),
+        # Recent-activity scans (reminders, reports) covering user_id
+        db.Index('ix_quiz_result_date_user', 'date_taken', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     score = db.Column(db.Integer)
     date_taken = db.Column(db.DateTime, default=lambda: datetime.now(IST))
     result = db.relationship('UserAnswer', backref='quiz_result', lazy='dynamic')
     quiz=db.relationship('Quiz', backref='results', lazy=True)
+
+# Keep Quiz.question_count in step with Question inserts, deletes and moves.
+# The counter is adjusted with an UPDATE on the flush connection so it commits
+# (or rolls back) together with the question change itself.
+def _adjust_question_count(connection, quiz_id, delta):
+    if quiz_id is None:
+        return
+    connection.execute(
+        update(Quiz.__table__)
+        .where(Quiz.__table__.c.id == quiz_id)
+        .values(question_count=Quiz.__table__.c.question_count + delta)
+    )
+    _touched_quiz_ids(connection).add(quiz_id)
+
+def _touched_quiz_ids(connection):
+    return connection.info.setdefault('question_count_quiz_ids', set())
+
+@event.listens_for(Question, 'after_insert')
+def _question_inserted(mapper, connection, target):
+    _adjust_question_count(connection, target.quiz_id, 1)
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    _adjust_question_count(connection, target.quiz_id, -1)
+
+@event.listens_for(Question, 'after_update')
+def _question_moved(mapper, connection, target):
+    history = db.inspect(target).attrs.quiz_id.history
+    if not history.has_changes():
+        return
+    for old_quiz_id in history.deleted:
+        _adjust_question_count(connection, old_quiz_id, -1)
+    for new_quiz_id in history.added:
+        _adjust_question_count(connection, new_quiz_id, 1)
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _expire_question_counts(session, flush_context):
+    # Loaded Quiz instances still hold the pre-flush counter value
+    connection = session.connection()
+    quiz_ids = connection.info.pop('question_count_quiz_ids', None)
+    if not quiz_ids:
+        return
+    for quiz_id in quiz_ids:
+        quiz = session.identity_map.get(db.inspect(Quiz).identity_key_from_primary_key([quiz_id]))
+        if quiz is not None:
+            session.expire(quiz, ['question_count'])
+
+# Analytics rollups, kept current by the QuizResult insert event below
+class SubjectStats(db.Model):
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    scored_attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    max_score = db.Column(db.Integer)
+    min_score = db.Column(db.Integer)
+
+class UserSubjectStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class UserMonthStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+@event.listens_for(QuizResult, 'after_insert')
+def _quiz_result_inserted(mapper, connection, target):
+    from backend.models.rollups import record_quiz_result
+    record_quiz_result(connection, target.user_id, target.quiz_id, target.score, target.date_taken)
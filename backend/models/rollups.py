@@ -0,0 +1,117 @@
+"""
+Analytics Rollups
+Incremental upkeep and full rebuild of the per-subject, per-user-subject and per-user-month attempt tables
+"""
+from sqlalchemy import case, delete, func, select
+from backend.models.model import Chapter, Quiz, QuizResult, SubjectStats, UserSubjectStats, UserMonthStats
+
+def _dialect_insert(connection, table):
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+def _upsert(connection, table, keys, counters, maximums=None, minimums=None):
+    """
+    Insert the row, or on conflict add the counters onto the existing row and
+    widen the max/min columns. Runs as one atomic statement.
+    """
+    maximums = maximums or {}
+    minimums = minimums or {}
+    stmt = _dialect_insert(connection, table).values(**keys, **counters, **maximums, **minimums)
+    excluded = stmt.excluded
+
+    set_ = {name: table.c[name] + excluded[name] for name in counters}
+    for name in maximums:
+        set_[name] = case(
+            (table.c[name].is_(None), excluded[name]),
+            (excluded[name] > table.c[name], excluded[name]),
+            else_=table.c[name]
+        )
+    for name in minimums:
+        set_[name] = case(
+            (table.c[name].is_(None), excluded[name]),
+            (excluded[name] < table.c[name], excluded[name]),
+            else_=table.c[name]
+        )
+    connection.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+
+def _subject_id_for_quiz(connection, quiz_id):
+    return connection.execute(
+        select(Chapter.subject_id).join(Quiz, Quiz.chapter_id == Chapter.id).where(Quiz.id == quiz_id)
+    ).scalar()
+
+def record_quiz_result(connection, user_id, quiz_id, score, date_taken):
+    """Fold one new attempt into the rollups, on the caller's transaction"""
+    subject_id = _subject_id_for_quiz(connection, quiz_id)
+    if subject_id is not None:
+        _upsert(
+            connection, SubjectStats.__table__,
+            {'subject_id': subject_id},
+            {
+                'attempts': 1,
+                'scored_attempts': 1 if score is not None else 0,
+                'score_sum': score or 0
+            },
+            maximums={'max_score': score},
+            minimums={'min_score': score}
+        )
+        _upsert(
+            connection, UserSubjectStats.__table__,
+            {'user_id': user_id, 'subject_id': subject_id},
+            {'attempts': 1}
+        )
+
+    if date_taken is not None:
+        _upsert(
+            connection, UserMonthStats.__table__,
+            {'user_id': user_id, 'year': date_taken.year, 'month': date_taken.month},
+            {'attempts': 1}
+        )
+
+def rebuild_rollups(connection):
+    """Recompute every rollup table from quiz_result; returns the number of rows written per table"""
+    subject_id = Chapter.subject_id
+    results_by_subject = (
+        select(QuizResult)
+        .join(Quiz, QuizResult.quiz_id == Quiz.id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+    )
+    year = func.extract('year', QuizResult.date_taken)
+    month = func.extract('month', QuizResult.date_taken)
+
+    rebuilds = [
+        (
+            SubjectStats.__table__,
+            ['subject_id', 'attempts', 'scored_attempts', 'score_sum', 'max_score', 'min_score'],
+            results_by_subject.with_only_columns(
+                subject_id,
+                func.count(QuizResult.id),
+                func.count(QuizResult.score),
+                func.coalesce(func.sum(QuizResult.score), 0),
+                func.max(QuizResult.score),
+                func.min(QuizResult.score)
+            ).group_by(subject_id)
+        ),
+        (
+            UserSubjectStats.__table__,
+            ['user_id', 'subject_id', 'attempts'],
+            results_by_subject.with_only_columns(
+                QuizResult.user_id, subject_id, func.count(QuizResult.id)
+            ).group_by(QuizResult.user_id, subject_id)
+        ),
+        (
+            UserMonthStats.__table__,
+            ['user_id', 'year', 'month', 'attempts'],
+            select(QuizResult.user_id, year, month, func.count(QuizResult.id))
+            .where(QuizResult.date_taken.isnot(None))
+            .group_by(QuizResult.user_id, year, month)
+        ),
+    ]
+
+    written = {}
+    for table, columns, query in rebuilds:
+        connection.execute(delete(table))
+        written[table.name] = connection.execute(table.insert().from_select(columns, query)).rowcount
+    return written
@@ -0,0 +1,144 @@
+"""
+Schema Migrations
+Ordered, idempotent upgrade steps applied on top of db.create_all() for existing databases
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from backend.extensions import db
+
+MIGRATIONS = []
+
+class MigrationError(RuntimeError):
+    """A migration cannot run until the data is fixed by hand; applied lists the steps that did run"""
+    def __init__(self, message, applied=()):
+        super().__init__(message)
+        self.applied = list(applied)
+
+def migration(version, description):
+    """Register an upgrade step; steps run once each, in version order"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+def _column_names(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+def _ensure_migrations_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migration ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def applied_versions():
+    with db.engine.begin() as connection:
+        _ensure_migrations_table(connection)
+        return {row[0] for row in connection.execute(text("SELECT version FROM schema_migration"))}
+
+def upgrade_schema():
+    """
+    Apply every pending migration, each in its own transaction. Steps do not
+    depend on each other, so a blocked step (MigrationError) is skipped and
+    retried on the next upgrade while the later ones still run; the blocked
+    steps are raised together as one MigrationError at the end.
+    """
+    done = applied_versions()
+    applied, blocked = [], []
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                step(connection)
+                connection.execute(
+                    text("INSERT INTO schema_migration (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+        except MigrationError as e:
+            blocked.append(f"migration {version} ({description}): {e}")
+            continue
+        applied.append({'version': version, 'description': description})
+    if blocked:
+        raise MigrationError('; '.join(blocked), applied)
+    return applied
+
+@migration(1, 'Add stored quiz.question_count and backfill it')
+def add_quiz_question_count(connection):
+    if 'question_count' not in _column_names(connection, 'quiz'):
+        connection.execute(text("ALTER TABLE quiz ADD COLUMN question_count INTEGER NOT NULL DEFAULT 0"))
+    from backend.models.counters import REPAIR_QUESTION_COUNTS_SQL
+    connection.execute(REPAIR_QUESTION_COUNTS_SQL)
+
+# Indexes on the hot filter and join columns, as declared on the models
+HOT_PATH_INDEXES = {
+    'chapter': ('ix_chapter_subject_id',),
+    'quiz': ('ix_quiz_chapter_id', 'ix_quiz_date_of_quiz'),
+    'question': ('ix_question_quiz_id',),
+    'quiz_result': (
+        'uq_quiz_result_user_quiz',
+        'ix_quiz_result_user_date',
+        'ix_quiz_result_date_user',
+        'ix_quiz_result_quiz_id',
+    ),
+    'user_answer': ('ix_user_answer_quiz_result_id',),
+}
+
+def hot_path_indexes():
+    indexes = []
+    for table_name, index_names in HOT_PATH_INDEXES.items():
+        table = db.metadata.tables[table_name]
+        by_name = {index.name: index for index in table.indexes}
+        indexes.extend(by_name[name] for name in index_names)
+    return indexes
+
+DUPLICATE_QUIZ_RESULT_IDS_SQL = (
+    "SELECT id FROM quiz_result WHERE id NOT IN "
+    "(SELECT MIN(id) FROM quiz_result GROUP BY user_id, quiz_id)"
+)
+
+def find_duplicate_quiz_results(connection):
+    """Repeat submissions of a (user, quiz) pair beyond the first, with their answer counts"""
+    rows = connection.execute(text(
+        "SELECT quiz_result.id, quiz_result.user_id, quiz_result.quiz_id, quiz_result.score, "
+        "quiz_result.date_taken, (SELECT COUNT(*) FROM user_answer WHERE user_answer.quiz_result_id = quiz_result.id) "
+        f"FROM quiz_result WHERE quiz_result.id IN ({DUPLICATE_QUIZ_RESULT_IDS_SQL}) ORDER BY quiz_result.id"
+    )).all()
+    return [
+        {'id': id, 'user_id': user_id, 'quiz_id': quiz_id, 'score': score,
+         'date_taken': str(date_taken), 'answers': answers}
+        for id, user_id, quiz_id, score, date_taken, answers in rows
+    ]
+
+def delete_duplicate_quiz_results(connection):
+    """Keep the first attempt of every (user, quiz) pair; returns the deleted results"""
+    duplicates = find_duplicate_quiz_results(connection)
+    if duplicates:
+        connection.execute(text(f"DELETE FROM user_answer WHERE quiz_result_id IN ({DUPLICATE_QUIZ_RESULT_IDS_SQL})"))
+        connection.execute(text(f"DELETE FROM quiz_result WHERE id IN ({DUPLICATE_QUIZ_RESULT_IDS_SQL})"))
+    return duplicates
+
+@migration(2, 'Add hot path indexes and unique (user_id, quiz_id) on quiz_result')
+def add_hot_path_indexes(connection):
+    # The unique index needs one result per (user, quiz); never delete submissions implicitly
+    duplicates = len(find_duplicate_quiz_results(connection))
+    if duplicates:
+        raise MigrationError(
+            f"quiz_result holds {duplicates} repeat submission(s) of the same quiz; review them with "
+            "`flask --app backend.app dedupe-quiz-results --dry-run`, then run it without --dry-run"
+        )
+    for index in hot_path_indexes():
+        index.create(connection, checkfirst=True)
+
+@migration(3, 'Backfill analytics rollup tables from quiz_result')
+def backfill_rollups(connection):
+    from backend.models.rollups import rebuild_rollups
+    rebuild_rollups(connection)
+
+@migration(4, 'Create and populate the full-text search index')
+def add_search_index(connection):
+    from backend.models.search import create_search_index, rebuild_search_index
+    create_search_index(connection)
+    rebuild_search_index(connection)
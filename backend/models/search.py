@@ -0,0 +1,221 @@
+"""
+Full-Text Search Index
+One document per subject, chapter, quiz and user in an FTS5 table (SQLite) or a
+tsvector table (Postgres), kept in sync with ORM flushes and queried with ranking.
+
+Quiz documents carry their chapter name, subject name, date, remarks and question
+titles; chapter documents carry their subject name. Renaming a subject or chapter
+therefore re-indexes the quizzes beneath it.
+"""
+import re
+import time
+import weakref
+from collections import defaultdict
+from sqlalchemy import event, inspect, select, text
+from backend.extensions import db
+from backend.models.model import Subject, Chapter, Quiz, Question, User
+
+# rowid = ref_id * KIND_SLOTS + kind code, so a document is addressed by primary key
+KIND_CODES = {'subject': 1, 'chapter': 2, 'quiz': 3, 'user': 4}
+KIND_SLOTS = 8
+MODEL_KINDS = {Subject: 'subject', Chapter: 'chapter', Quiz: 'quiz', User: 'user'}
+
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, content, tokenize='unicode61')",
+]
+
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS search_index ("
+    "rowid BIGINT PRIMARY KEY, "
+    "kind VARCHAR(16) NOT NULL, "
+    "ref_id INTEGER NOT NULL, "
+    "content TEXT NOT NULL, "
+    "tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_tsv ON search_index USING GIN (tsv)",
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Engine -> True once search_index exists, or the monotonic time it was last found missing
+_index_state = weakref.WeakKeyDictionary()
+MISSING_INDEX_RECHECK_SECONDS = 60
+
+def _rowid(kind, ref_id):
+    return ref_id * KIND_SLOTS + KIND_CODES[kind]
+
+def _is_postgres(connection):
+    return connection.dialect.name == 'postgresql'
+
+def create_search_index(connection):
+    for statement in (POSTGRES_DDL if _is_postgres(connection) else SQLITE_DDL):
+        connection.execute(text(statement))
+    _index_state.pop(connection.engine, None)
+
+def search_index_exists(connection):
+    """
+    Whether migration 4 has created search_index. Until it has, flushes skip
+    indexing and searches find nothing instead of failing; a missing table is
+    looked up again at most every MISSING_INDEX_RECHECK_SECONDS.
+    """
+    engine = connection.engine
+    state = _index_state.get(engine)
+    if state is True:
+        return True
+    if state is not None and time.monotonic() - state < MISSING_INDEX_RECHECK_SECONDS:
+        return False
+    exists = inspect(connection).has_table('search_index')
+    _index_state[engine] = True if exists else time.monotonic()
+    return exists
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+def _build_documents(connection, kind, ids=None):
+    """Yield (ref_id, content) for the given kind, restricted to ids when given"""
+    def restrict(query, column):
+        return query.where(column.in_(ids)) if ids is not None else query
+
+    if kind == 'subject':
+        rows = connection.execute(restrict(select(Subject.id, Subject.name, Subject.description), Subject.id))
+        for subject_id, name, description in rows:
+            yield subject_id, _join(name, description)
+
+    elif kind == 'chapter':
+        rows = connection.execute(restrict(
+            select(Chapter.id, Chapter.name, Chapter.description, Subject.name)
+            .outerjoin(Subject, Chapter.subject_id == Subject.id), Chapter.id
+        ))
+        for chapter_id, name, description, subject_name in rows:
+            yield chapter_id, _join(name, description, subject_name)
+
+    elif kind == 'quiz':
+        titles = defaultdict(list)
+        for quiz_id, title in connection.execute(restrict(select(Question.quiz_id, Question.title), Question.quiz_id)):
+            titles[quiz_id].append(title)
+        rows = connection.execute(restrict(
+            select(Quiz.id, Quiz.date_of_quiz, Quiz.remarks, Chapter.name, Subject.name)
+            .outerjoin(Chapter, Quiz.chapter_id == Chapter.id)
+            .outerjoin(Subject, Chapter.subject_id == Subject.id), Quiz.id
+        ))
+        for quiz_id, date_of_quiz, remarks, chapter_name, subject_name in rows:
+            yield quiz_id, _join(
+                f'quiz {quiz_id}', date_of_quiz.isoformat() if date_of_quiz else None,
+                remarks, chapter_name, subject_name, *titles[quiz_id]
+            )
+
+    elif kind == 'user':
+        rows = connection.execute(restrict(select(User.id, User.full_name, User.email, User.qualification), User.id))
+        for user_id, full_name, email, qualification in rows:
+            yield user_id, _join(full_name, email, qualification)
+
+def _write_documents(connection, kind, documents):
+    params = [
+        {'rowid': _rowid(kind, ref_id), 'kind': kind, 'ref_id': ref_id, 'content': content}
+        for ref_id, content in documents
+    ]
+    if params:
+        connection.execute(
+            text("INSERT INTO search_index (rowid, kind, ref_id, content) VALUES (:rowid, :kind, :ref_id, :content)"),
+            params
+        )
+
+def reindex(connection, kind, ids):
+    """Replace the documents of the given ids; ids whose row no longer exists are dropped"""
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    connection.execute(
+        text("DELETE FROM search_index WHERE rowid = :rowid"),
+        [{'rowid': _rowid(kind, ref_id)} for ref_id in ids]
+    )
+    _write_documents(connection, kind, _build_documents(connection, kind, ids))
+
+def rebuild_search_index(connection):
+    """Drop and rebuild every document; returns the number of documents per kind"""
+    connection.execute(text("DELETE FROM search_index"))
+    written = {}
+    for kind in KIND_CODES:
+        documents = list(_build_documents(connection, kind))
+        _write_documents(connection, kind, documents)
+        written[kind] = len(documents)
+    return written
+
+def _match_expression(connection, query):
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    if _is_postgres(connection):
+        return ' & '.join(f'{token}:*' for token in tokens)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def search_ids(kind, query, limit=DEFAULT_SEARCH_LIMIT):
+    """Ids of the best matching documents of one kind, best first"""
+    connection = db.session.connection()
+    match = _match_expression(connection, query)
+    if match is None or not search_index_exists(connection):
+        return []
+    limit = max(1, min(limit or DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT))
+
+    if _is_postgres(connection):
+        sql = (
+            "SELECT ref_id FROM search_index, to_tsquery('simple', :match) AS query "
+            "WHERE kind = :kind AND tsv @@ query "
+            "ORDER BY ts_rank(tsv, query) DESC, ref_id LIMIT :limit"
+        )
+    else:
+        sql = (
+            "SELECT ref_id FROM search_index "
+            "WHERE search_index MATCH :match AND kind = :kind "
+            "ORDER BY rank, ref_id LIMIT :limit"
+        )
+    rows = connection.execute(text(sql), {'match': match, 'kind': kind, 'limit': limit})
+    return [int(ref_id) for (ref_id,) in rows]
+
+def load_ranked(model, ids, *options):
+    """Load rows for ids, returned in the same (ranked) order"""
+    if not ids:
+        return []
+    rows = model.query.options(*options).filter(model.id.in_(ids)).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[ref_id] for ref_id in ids if ref_id in by_id]
+
+def _collect_changes(session):
+    """Documents touched by this flush, by kind"""
+    changed = defaultdict(set)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Question):
+            history = db.inspect(obj).attrs.quiz_id.history
+            changed['quiz'].update(quiz_id for quiz_id in (obj.quiz_id, *history.deleted) if quiz_id)
+            continue
+        kind = MODEL_KINDS.get(type(obj))
+        if kind and obj.id is not None:
+            changed[kind].add(obj.id)
+    return changed
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    changed = _collect_changes(session)
+    if not changed:
+        return
+
+    connection = session.connection()
+    if not search_index_exists(connection):
+        return
+    # Subject and chapter names are part of the documents beneath them
+    if changed['subject']:
+        changed['chapter'].update(connection.execute(
+            select(Chapter.id).where(Chapter.subject_id.in_(changed['subject']))
+        ).scalars())
+    if changed['chapter']:
+        changed['quiz'].update(connection.execute(
+            select(Quiz.id).where(Quiz.chapter_id.in_(changed['chapter']))
+        ).scalars())
+
+    for kind in KIND_CODES:
+        reindex(connection, kind, changed[kind])
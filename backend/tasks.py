@@ -239,4 +239,55 @@ def monthly_performance_reports():
         return {
             'status': 'error',
             'message': str(e)
-        } 
\ No newline at end of file
+        } 
+
+@celery.task
+def rebuild_analytics_rollups():
+    """Recompute the analytics rollup tables from raw quiz results"""
+    try:
+        app = create_app()
+        with app.app_context():
+            from backend.models.rollups import rebuild_rollups
+            with db.engine.begin() as connection:
+                written = rebuild_rollups(connection)
+            
+            return {
+                'status': 'success',
+                'message': f'Rollups rebuilt: {written}'
+            }
+            
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+_warm_app = None
+
+def _get_warm_app():
+    """One app per worker process for the warmer, which runs every few minutes"""
+    global _warm_app
+    if _warm_app is None:
+        _warm_app = create_app()
+    return _warm_app
+
+@celery.task
+def warm_response_cache():
+    """Render the cache warm manifest so users never pay for a cold cache"""
+    try:
+        app = _get_warm_app()
+        with app.app_context():
+            from backend.utils.cache_warmer import warm_cache
+            result = warm_cache(app)
+            
+            return {
+                'status': 'success' if not result['failed'] else 'partial',
+                'message': f"Warmed {result['warmed']} responses ({result['fresh']} still fresh) and {result['snapshots']} quiz snapshots",
+                'failed': result['failed']
+            }
+            
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
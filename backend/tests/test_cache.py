@@ -0,0 +1,224 @@
+"""
+Response Cache Tests
+Run with: python -m pytest backend/tests
+"""
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from flask import Flask, jsonify, request
+from backend.utils import cache
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+@unittest.skipIf(fakeredis is None, 'needs fakeredis[lua]')
+class CacheTestCase(unittest.TestCase):
+    """An app whose cache module talks to one in-memory Redis"""
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        self.binary = fakeredis.FakeRedis(server=server)
+        release_script = self.redis.register_script(cache._RELEASE_LOCK_SCRIPT.script)
+        for name, value in (('redis_client', self.redis), ('redis_binary_client', self.binary),
+                            ('_RELEASE_LOCK_SCRIPT', release_script), ('record_cache_event', mock.Mock())):
+            patcher = mock.patch.object(cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = Flask(__name__)
+
+    def cache_keys(self):
+        return [key for key in self.redis.keys('cache:*') if not key.endswith(':lock')]
+
+class RecomputeLockTest(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+        self.computing = threading.Event()
+        self.finish = threading.Event()
+        self.finish.set()
+
+        @self.app.route('/value')
+        @cache.cache_response(expire_time=60, local=False, lock_wait=5)
+        def value():
+            self.calls += 1
+            self.computing.set()
+            self.finish.wait(5)
+            return jsonify(version=self.calls)
+
+    def get_version(self):
+        return self.app.test_client().get('/value').get_json()['version']
+
+    def run_concurrently(self, count):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get_version())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_cold_miss_is_computed_once_while_the_others_wait(self):
+        self.finish.clear()
+        threads, results = self.run_concurrently(8)
+        self.assertTrue(self.computing.wait(5))
+        time.sleep(0.1)
+        self.finish.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 8)
+
+    def test_stale_entry_is_served_while_one_worker_recomputes(self):
+        self.assertEqual(self.get_version(), 1)
+        [cache_key] = self.cache_keys()
+        self.binary.hset(cache_key, 'fresh_until', time.time() - 1)
+
+        self.computing.clear()
+        self.finish.clear()
+        recompute, results = self.run_concurrently(1)
+        self.assertTrue(self.computing.wait(5))
+        # The lock is held: everyone else gets the stale copy at once, without running the view
+        self.assertEqual([self.get_version() for _ in range(5)], [1] * 5)
+        self.assertEqual(self.calls, 2)
+
+        self.finish.set()
+        recompute[0].join()
+        self.assertEqual(results, [2])
+        self.assertEqual(self.get_version(), 2)
+        self.assertFalse(self.redis.exists(f"{cache_key}:lock"))
+
+class ReleaseLockTest(CacheTestCase):
+    def test_release_with_another_token_leaves_the_lock(self):
+        self.redis.set('cache:v3:view:abc:lock', 'successor')
+        cache._release_recompute_lock('cache:v3:view:abc', 'expired-holder')
+        self.assertEqual(self.redis.get('cache:v3:view:abc:lock'), 'successor')
+        cache._release_recompute_lock('cache:v3:view:abc', 'successor')
+        self.assertFalse(self.redis.exists('cache:v3:view:abc:lock'))
+
+    def test_recompute_past_its_lease_keeps_the_successors_lock(self):
+        @self.app.route('/slow')
+        @cache.cache_response(expire_time=60, local=False)
+        def slow():
+            # Our lease ran out mid-recompute and another worker took the lock
+            [lock_key] = self.redis.keys('cache:*:lock')
+            self.redis.set(lock_key, 'successor')
+            return jsonify(ok=True)
+
+        self.assertEqual(self.app.test_client().get('/slow').status_code, 200)
+        [lock_key] = self.redis.keys('cache:*:lock')
+        self.assertEqual(self.redis.get(lock_key), 'successor')
+
+class TagInvalidationTest(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = {'subjects': 0, 'quiz': 0}
+
+        @self.app.route('/subjects')
+        @cache.cache_response(expire_time=60, local=False, tags=('subjects',))
+        def get_subjects():
+            self.calls['subjects'] += 1
+            return jsonify(version=self.calls['subjects'])
+
+        @self.app.route('/subjects', methods=['POST'])
+        @cache.invalidate_cache('subjects')
+        def create_subject():
+            if not request.get_json().get('name'):
+                return jsonify(message='Name is required'), 400
+            return jsonify(message='Subject created'), 201
+
+        @self.app.route('/quizzes/<int:quiz_id>')
+        @cache.cache_response(expire_time=60, local=False, tags=('quiz:{quiz_id}',))
+        def get_quiz(quiz_id):
+            self.calls['quiz'] += 1
+            return jsonify(quiz_id=quiz_id, version=self.calls['quiz'])
+
+        @self.app.route('/quizzes/<int:quiz_id>', methods=['PUT'])
+        @cache.invalidate_cache('quiz:{quiz_id}')
+        def update_quiz(quiz_id):
+            return jsonify(message='Quiz updated')
+
+        self.client = self.app.test_client()
+
+    def version(self, path):
+        return self.client.get(path).get_json()['version']
+
+    def test_write_drops_the_tagged_response(self):
+        self.assertEqual(self.version('/subjects'), 1)
+        [cache_key] = self.cache_keys()
+        self.assertEqual(self.redis.smembers('tag:subjects'), {cache_key})
+        self.assertEqual(self.version('/subjects'), 1)
+
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(cache.INVALIDATION_CHANNEL)
+        self.assertEqual(self.client.post('/subjects', json={'name': 'Physics'}).status_code, 201)
+        self.assertFalse(self.redis.exists(cache_key))
+        self.assertFalse(self.redis.exists('tag:subjects'))
+        # The first read only consumes the (ignored) subscribe confirmation
+        message = pubsub.get_message(timeout=1.0) or pubsub.get_message(timeout=1.0)
+        self.assertEqual(json.loads(message['data']), [cache_key])
+        pubsub.close()
+
+        self.assertEqual(self.version('/subjects'), 2)
+
+    def test_failed_write_keeps_the_cached_response(self):
+        self.assertEqual(self.version('/subjects'), 1)
+        self.assertEqual(self.client.post('/subjects', json={}).status_code, 400)
+        self.assertEqual(self.version('/subjects'), 1)
+        self.assertEqual(self.calls['subjects'], 1)
+
+    def test_tag_templates_only_drop_the_written_quiz(self):
+        self.assertEqual(self.version('/quizzes/1'), 1)
+        self.assertEqual(self.version('/quizzes/2'), 2)
+        self.client.put('/quizzes/2')
+        self.assertEqual(self.version('/quizzes/1'), 1)
+        self.assertEqual(self.version('/quizzes/2'), 3)
+        self.assertTrue(self.redis.exists('tag:quiz:1'))
+
+    def test_invalidate_tags_across_several_tags(self):
+        self.version('/subjects')
+        self.version('/quizzes/1')
+        self.version('/quizzes/2')
+        with self.app.test_request_context():
+            self.assertEqual(cache.invalidate_tags('subjects', 'quiz:1', 'quiz:9'), 2)
+        self.assertEqual(len(self.cache_keys()), 1)
+        self.assertEqual(self.redis.keys('tag:*'), ['tag:quiz:2'])
+
+class StoredHeadersTest(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+
+        @self.app.route('/report')
+        @cache.cache_response(expire_time=60, local=False)
+        def report():
+            response = jsonify(rows=['x' * 40] * int(request.args.get('rows', 1)))
+            response.headers['Cache-Control'] = 'private, max-age=60'
+            response.vary.add('Authorization')
+            response.set_cookie('visited', '1')
+            response.headers['RateLimit-Remaining'] = '59'
+            return response
+
+        self.client = self.app.test_client()
+
+    def test_hit_replays_the_views_headers(self):
+        miss = self.client.get('/report')
+        hit = self.client.get('/report')
+        self.assertEqual(hit.get_json(), miss.get_json())
+        self.assertEqual(hit.headers['Cache-Control'], 'private, max-age=60')
+        self.assertEqual(hit.headers['Vary'], 'Authorization')
+        self.assertEqual(hit.content_type, 'application/json')
+        self.assertEqual(int(hit.headers['Content-Length']), len(hit.get_data()))
+        self.assertNotIn('Set-Cookie', hit.headers)
+        self.assertNotIn('RateLimit-Remaining', hit.headers)
+
+    def test_compressed_hit_adds_to_the_views_vary(self):
+        self.client.get('/report?rows=100')
+        hit = self.client.get('/report?rows=100', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(hit.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(set(hit.headers['Vary'].split(', ')), {'Authorization', 'Accept-Encoding'})
+        self.assertEqual(hit.headers['Cache-Control'], 'private, max-age=60')
+
+if __name__ == '__main__':
+    unittest.main()
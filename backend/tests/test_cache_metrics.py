@@ -0,0 +1,35 @@
+"""
+Cache Metrics Tests
+Run with: python -m pytest backend/tests
+"""
+import unittest
+from unittest import mock
+from backend.utils.cache_metrics import record_cache_event, cache_metrics_key
+from backend.utils.metrics_buffer import MetricsBuffer
+
+class RecordCacheEventTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = mock.MagicMock()
+        self.buffer = MetricsBuffer(self.redis, flush_interval=60, max_pending=10 ** 6)
+        patcher = mock.patch('backend.utils.cache_metrics.get_metrics_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookups_are_buffered_without_touching_redis(self):
+        for _ in range(100):
+            record_cache_event('user.get_user_quizzes', hits=1)
+        record_cache_event('user.get_user_quizzes', misses=1, recomputes=1, recompute_ms=12.5, bytes=2048)
+        self.redis.pipeline.assert_not_called()
+        self.redis.hincrby.assert_not_called()
+
+    def test_flush_sends_one_summed_increment_per_counter(self):
+        for _ in range(100):
+            record_cache_event('user.get_user_quizzes', hits=1)
+        self.buffer.flush()
+        self.redis.pipeline.assert_called_once()
+        pipe = self.redis.pipeline.return_value
+        pipe.hincrby.assert_called_once_with(cache_metrics_key(), 'user.get_user_quizzes:hits', 100)
+        pipe.execute.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,16 @@
+"""
+Quiz Catalog Tests
+Run with: python -m pytest backend/tests
+"""
+import unittest
+from backend.benchmarks.catalog_queries import count_catalog_queries, CATALOG_QUERY_BUDGET
+
+class CatalogQueryCountTest(unittest.TestCase):
+    def test_query_count_does_not_grow_with_the_catalog(self):
+        for quizzes in (1, 50):
+            statements, loaded, _ = count_catalog_queries(quizzes)
+            self.assertEqual(loaded, quizzes)
+            self.assertEqual(sum(statements.values()), CATALOG_QUERY_BUDGET, dict(statements))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Local Cache Tests
+Run with: python -m pytest backend/tests
+"""
+import time
+import unittest
+from backend.utils.local_cache import (
+    LocalCache, InvalidationListener, INVALIDATION_CHANNEL, INVALIDATE_ALL, invalidation_message
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class LocalCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LocalCache(max_entries=2, ttl=30)
+        self.cache.connected = True
+
+    def test_fill_started_before_an_invalidation_is_discarded(self):
+        generation = self.cache.generation
+        self.cache.delete('cache:a')
+        self.cache.set('cache:a', 'old', generation=generation)
+        self.assertIsNone(self.cache.get('cache:a'))
+        self.cache.set('cache:a', 'new', generation=self.cache.generation)
+        self.assertEqual(self.cache.get('cache:a'), 'new')
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('cache:a', 1)
+        self.cache.set('cache:b', 2)
+        self.cache.get('cache:a')
+        self.cache.set('cache:c', 3)
+        self.assertEqual(self.cache.get('cache:a'), 1)
+        self.assertIsNone(self.cache.get('cache:b'))
+
+    def test_nothing_is_stored_or_served_while_disconnected(self):
+        self.cache.set('cache:a', 1)
+        self.cache.connected = False
+        self.assertIsNone(self.cache.get('cache:a'))
+        self.cache.set('cache:b', 2)
+        self.cache.connected = True
+        self.assertIsNone(self.cache.get('cache:b'))
+
+@unittest.skipIf(fakeredis is None, 'needs fakeredis[lua]')
+class InvalidationListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.cache = LocalCache(ttl=30)
+        InvalidationListener(self.redis, self.cache, retry_delay=0.05).start()
+        self.assertTrue(_wait_until(lambda: self.cache.connected))
+        self.cache.set('cache:a', 1)
+        self.cache.set('cache:b', 2)
+
+    def tearDown(self):
+        # The daemon listener keeps retrying against a dead server until the process exits
+        self.server.connected = False
+
+    def test_published_keys_are_evicted(self):
+        self.redis.publish(INVALIDATION_CHANNEL, invalidation_message(['cache:a']))
+        self.assertTrue(_wait_until(lambda: self.cache.get('cache:a') is None))
+        self.assertEqual(self.cache.get('cache:b'), 2)
+
+    def test_invalidate_all_empties_the_cache(self):
+        self.redis.publish(INVALIDATION_CHANNEL, INVALIDATE_ALL)
+        self.assertTrue(_wait_until(lambda: len(self.cache) == 0))
+
+    def test_nothing_is_served_while_unsubscribed(self):
+        self.server.connected = False
+        self.assertTrue(_wait_until(lambda: not self.cache.connected))
+        self.assertIsNone(self.cache.get('cache:b'))
+        self.cache.set('cache:c', 3)
+        self.assertEqual(len(self.cache), 0)
+
+        # Back on the channel with an empty cache: whatever was missed is gone
+        self.server.connected = True
+        self.assertTrue(_wait_until(lambda: self.cache.connected))
+        self.assertIsNone(self.cache.get('cache:a'))
+        self.cache.set('cache:a', 4)
+        self.assertEqual(self.cache.get('cache:a'), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+SQL Query Metrics Tests
+Run with: python -m pytest backend/tests
+"""
+import sqlite3
+import unittest
+from backend.utils.query_metrics import explain_statement, statement_fingerprint
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, parameters=None):
+        self.connection.executed.append(statement)
+        if statement.startswith('EXPLAIN') and self.connection.explain_error:
+            raise self.connection.explain_error
+
+    def fetchall(self):
+        return [('Seq Scan on quiz',)]
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Records what a Postgres-like DBAPI connection is asked to run"""
+    def __init__(self, explain_error=None, autocommit=False):
+        self.executed = []
+        self.explain_error = explain_error
+        self.autocommit = autocommit
+
+    def cursor(self):
+        return FakeCursor(self)
+
+class ExplainStatementTest(unittest.TestCase):
+    def test_postgres_explain_runs_inside_a_savepoint(self):
+        connection = FakeConnection()
+        plan = explain_statement(FakeCursor(connection), 'postgresql', 'SELECT * FROM quiz', {})
+        self.assertEqual(plan, ['Seq Scan on quiz'])
+        self.assertEqual(connection.executed, [
+            'SAVEPOINT slow_sql_explain',
+            'EXPLAIN SELECT * FROM quiz',
+            'RELEASE SAVEPOINT slow_sql_explain',
+        ])
+
+    def test_failed_explain_rolls_back_to_the_savepoint_only(self):
+        connection = FakeConnection(explain_error=RuntimeError('cannot explain'))
+        with self.assertRaises(RuntimeError):
+            explain_statement(FakeCursor(connection), 'postgresql', 'SELECT * FROM quiz', {})
+        self.assertEqual(connection.executed[-1], 'ROLLBACK TO SAVEPOINT slow_sql_explain')
+
+    def test_autocommit_connection_needs_no_savepoint(self):
+        connection = FakeConnection(autocommit=True)
+        explain_statement(FakeCursor(connection), 'postgresql', 'SELECT 1', {})
+        self.assertEqual(connection.executed, ['EXPLAIN SELECT 1'])
+
+    def test_sqlite_query_plan_leaves_the_transaction_alone(self):
+        connection = sqlite3.connect(':memory:')
+        connection.execute('CREATE TABLE quiz (id INTEGER PRIMARY KEY, chapter_id INTEGER)')
+        connection.execute('INSERT INTO quiz (chapter_id) VALUES (1)')
+        self.assertTrue(connection.in_transaction)
+        plan = explain_statement(connection.cursor(), 'sqlite', 'SELECT * FROM quiz WHERE chapter_id = ?', (1,))
+        self.assertTrue(any(line.startswith('SCAN') for line in plan))
+        self.assertTrue(connection.in_transaction)
+
+    def test_only_selects_are_explained(self):
+        connection = FakeConnection()
+        self.assertIsNone(explain_statement(FakeCursor(connection), 'postgresql', 'UPDATE quiz SET id = 1', {}))
+        self.assertEqual(connection.executed, [])
+
+class StatementFingerprintTest(unittest.TestCase):
+    def test_literals_and_qmark_lists_collapse(self):
+        self.assertEqual(
+            statement_fingerprint("SELECT * FROM quiz WHERE id IN (?, ?, ?) AND remarks = 'x' LIMIT 10"),
+            "SELECT * FROM quiz WHERE id IN (?...) AND remarks = ? LIMIT ?"
+        )
+
+    def test_every_paramstyle_gives_the_same_shape(self):
+        expected = "SELECT * FROM question WHERE question.quiz_id IN (?...)"
+        for statement in (
+            "SELECT * FROM question WHERE question.quiz_id IN (?, ?)",
+            "SELECT * FROM question WHERE question.quiz_id IN (%(quiz_id_1_1)s, %(quiz_id_1_2)s, %(quiz_id_1_3)s)",
+            "SELECT * FROM question WHERE question.quiz_id IN (%s, %s)",
+            "SELECT * FROM question WHERE question.quiz_id IN ($1, $2, $3)",
+            "SELECT * FROM question WHERE question.quiz_id IN (:quiz_id_1, :quiz_id_2)",
+        ):
+            self.assertEqual(statement_fingerprint(statement), expected, statement)
+
+    def test_single_named_placeholder_and_casts(self):
+        self.assertEqual(
+            statement_fingerprint("SELECT id::text FROM quiz WHERE id = %(id_1)s"),
+            "SELECT id::text FROM quiz WHERE id = ?"
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Circuit Breaker Tests
+Run with: python -m pytest backend/tests
+"""
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+from redis.exceptions import ConnectionError, NoScriptError, ResponseError, TimeoutError
+from backend.benchmarks.redis_outage import LatencyProxy
+from backend.utils.redis_factory import CircuitBreaker, CircuitOpenError, create_redis_client
+
+def _fail(error):
+    def call():
+        raise error
+    return call
+
+class CircuitBreakerTest(unittest.TestCase):
+    def open_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                breaker.call(_fail(ConnectionError('down')))
+        self.assertEqual(breaker.state, breaker.OPEN)
+        return breaker
+
+    def after_cooldown(self):
+        return mock.patch('backend.utils.redis_factory.time.monotonic', return_value=10 ** 9)
+
+    def test_opens_after_threshold_and_short_circuits(self):
+        breaker = self.open_breaker()
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'never called')
+        self.assertEqual(breaker.stats['short_circuited'], 1)
+
+    def test_reply_error_on_half_open_trial_closes_breaker(self):
+        breaker = self.open_breaker()
+        with self.after_cooldown():
+            with self.assertRaises(NoScriptError):
+                breaker.call(_fail(NoScriptError('NOSCRIPT No matching script')))
+            self.assertEqual(breaker.state, breaker.CLOSED)
+            self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    def test_response_error_counts_as_reachable(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+        with self.assertRaises(ResponseError):
+            breaker.call(_fail(ResponseError('WRONGTYPE')))
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_unexpected_error_on_trial_releases_it(self):
+        breaker = self.open_breaker()
+        with self.after_cooldown():
+            with self.assertRaises(ValueError):
+                breaker.call(_fail(ValueError('bad reply')))
+            self.assertEqual(breaker.state, breaker.HALF_OPEN)
+            # The next call gets the trial instead of being short-circuited forever
+            self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        breaker = self.open_breaker()
+        with self.after_cooldown():
+            with self.assertRaises(ConnectionError):
+                breaker.call(_fail(ConnectionError('still down')))
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+def _pong_server():
+    """A stand-in Redis upstream that answers every request with +PONG"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+
+    def serve(client):
+        with client:
+            while client.recv(65536):
+                client.sendall(b'+PONG\r\n')
+
+    def accept():
+        while True:
+            client, _ = server.accept()
+            threading.Thread(target=serve, args=(client,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()
+
+class SlowServerTest(unittest.TestCase):
+    """A real client against the latency-injecting stand-in from backend.benchmarks.redis_outage"""
+
+    def client_for(self, proxy, breaker):
+        return create_redis_client({
+            'REDIS_URL': f'redis://127.0.0.1:{proxy.port}/0',
+            'REDIS_SOCKET_TIMEOUT': 0.05,
+            'REDIS_CONNECT_TIMEOUT': 0.05,
+            'REDIS_MAX_CONNECTIONS': 2,
+        }, breaker)
+
+    def assert_opens(self, client, breaker):
+        for _ in range(breaker.failure_threshold):
+            with self.assertRaises(TimeoutError):
+                client.ping()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        started = time.monotonic()
+        for _ in range(20):
+            with self.assertRaises(CircuitOpenError):
+                client.ping()
+        # Short-circuited calls never wait on the socket timeout
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(breaker.stats['short_circuited'], 20)
+
+    def test_breaker_opens_against_a_hung_server(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        self.assert_opens(self.client_for(LatencyProxy().start(), breaker), breaker)
+
+    def test_breaker_opens_when_latency_exceeds_the_socket_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        proxy = LatencyProxy(upstream=_pong_server(), latency=0.2).start()
+        self.assert_opens(self.client_for(proxy, breaker), breaker)
+
+    def test_breaker_stays_closed_when_latency_is_within_the_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        client = self.client_for(LatencyProxy(upstream=_pong_server(), latency=0.01).start(), breaker)
+        for _ in range(5):
+            self.assertTrue(client.ping())
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(breaker.stats['failures'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
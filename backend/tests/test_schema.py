@@ -0,0 +1,63 @@
+"""
+Schema Migration Tests
+Run with: python -m pytest backend/tests
+"""
+import unittest
+from flask import Flask
+from sqlalchemy import text
+from backend.extensions import db
+from backend.models.model import Subject
+from backend.models.schema import upgrade_schema, applied_versions, MigrationError
+import backend.models.search as search
+
+class UpgradeSchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        search._index_state.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS search_index"))
+            connection.execute(text("DROP TABLE IF EXISTS schema_migration"))
+        self.context.pop()
+
+    def add_repeat_submission(self):
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX uq_quiz_result_user_quiz"))
+            connection.execute(text("INSERT INTO user (id, email, password) VALUES (1, 'u@example.com', 'x')"))
+            connection.execute(text("INSERT INTO subject (id, name, description) VALUES (1, 'S', '')"))
+            connection.execute(text("INSERT INTO chapter (id, name, description, subject_id) VALUES (1, 'C', '', 1)"))
+            connection.execute(text(
+                "INSERT INTO quiz (id, chapter_id, date_of_quiz, time_duration, remarks, question_count) "
+                "VALUES (1, 1, '2030-01-01', '00:10', '', 0)"
+            ))
+            for score in (10, 20):
+                connection.execute(text(
+                    "INSERT INTO quiz_result (user_id, quiz_id, score, date_taken) VALUES (1, 1, :score, '2026-01-01')"
+                ), {'score': score})
+
+    def test_blocked_migration_does_not_hold_back_the_others(self):
+        self.add_repeat_submission()
+        with self.assertRaises(MigrationError) as raised:
+            upgrade_schema()
+        self.assertEqual([step['version'] for step in raised.exception.applied], [1, 3, 4])
+        self.assertEqual(applied_versions(), {1, 3, 4})
+
+        db.session.add(Subject(name='Physics', description='d'))
+        db.session.commit()
+        self.assertEqual(len(search.search_ids('subject', 'physics')), 1)
+
+    def test_writes_skip_indexing_until_the_search_index_exists(self):
+        db.session.add(Subject(name='Physics', description='d'))
+        db.session.commit()
+        self.assertEqual(search.search_ids('subject', 'physics'), [])
+
+if __name__ == '__main__':
+    unittest.main()
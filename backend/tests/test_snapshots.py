@@ -0,0 +1,41 @@
+"""
+Quiz Snapshot Tests
+Run with: python -m pytest backend/tests
+"""
+import unittest
+from datetime import date
+from flask import Flask
+from backend.extensions import db
+from backend.models.model import Subject, Chapter, Quiz, Question
+from backend.utils.snapshots import build_quiz_payload, quiz_snapshot_key, SNAPSHOT_FORMAT
+
+class QuizPayloadTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_student_payload_never_carries_the_answer_key(self):
+        quiz = Quiz(chapter=Chapter(name='C', description='', subject=Subject(name='S', description='')),
+                    date_of_quiz=date(2030, 1, 1), time_duration='00:10', remarks='')
+        db.session.add(Question(quiz=quiz, title='t', question_statement='s', option1='a', option2='b',
+                                option3='c', option4='d', correct_option=3))
+        db.session.commit()
+        payload = build_quiz_payload(quiz.id)
+        question = payload['quiz']['questions'][0]
+        self.assertNotIn('correct_option', question)
+        self.assertEqual(question['option3'], 'c')
+
+    def test_snapshot_keys_carry_the_payload_format(self):
+        self.assertIn(f':v{SNAPSHOT_FORMAT}:', quiz_snapshot_key(7, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,147 +2,596 @@
 Redis Caching and Rate Limiting Module
 Provides decorators for API optimization and security
 """
-import redis
 from redis.exceptions import RedisError
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, current_app, has_request_context
+import gzip
 import json
+import math
+import os
+import random
+import threading
 import time
+import uuid
+from collections import namedtuple
+from backend.config import Config
+from backend.utils.redis_factory import CircuitBreaker, create_redis_client, redis_settings
+from backend.utils.cache_keys import build_cache_key
+from backend.utils.cache_metrics import record_cache_event, record_rate_limit_event
+from backend.utils.local_rate_limit import LocalRateLimiter
+from backend.utils.local_cache import (
+    LocalCache, InvalidationListener, INVALIDATION_CHANNEL, INVALIDATE_ALL, invalidation_message
+)
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# One breaker for both clients: they talk to the same server
+redis_breaker = CircuitBreaker(Config.REDIS_BREAKER_THRESHOLD, Config.REDIS_BREAKER_COOLDOWN)
+redis_client = create_redis_client(redis_settings(Config), redis_breaker, decode_responses=True)
+# Same server, raw bytes in and out (pre-serialized / compressed payloads)
+redis_binary_client = create_redis_client(redis_settings(Config), redis_breaker, decode_responses=False)
 
 def get_redis_client():
     return redis_client
 
+def get_redis_binary_client():
+    return redis_binary_client
+
+_local_cache = None
+_local_cache_pid = None
+_local_cache_lock = threading.Lock()
+
+def get_local_cache():
+    """
+    The process-wide L1 cache, or None unless CACHE_L1_ENABLED is set.
+    Created lazily so each forked worker gets its own cache and listener thread.
+    """
+    global _local_cache, _local_cache_pid
+    config = current_app.config
+    if not config.get('CACHE_L1_ENABLED'):
+        return None
+    if _local_cache_pid != os.getpid():
+        with _local_cache_lock:
+            if _local_cache_pid != os.getpid():
+                _local_cache = LocalCache(
+                    max_entries=config.get('CACHE_L1_MAX_ENTRIES', 1024),
+                    ttl=config.get('CACHE_L1_TTL', 30)
+                )
+                InvalidationListener(redis_client, _local_cache).start()
+                _local_cache_pid = os.getpid()
+    return _local_cache
+
 def get_client_identifier():
     ip = request.remote_addr
     user_id = getattr(g, 'user_id', 'anonymous') if hasattr(g, 'user_id') else 'anonymous'
     return f"{ip}:{user_id}"
 
-def get_current_window():
-    return int(time.time() // 60)
+# Set in the WSGI environ of cache warmer requests (clients cannot set environ keys):
+# they skip rate limiting and recompute instead of reading the cache
+WARMER_ENVIRON_KEY = 'quizmaster.cache_warmer'
 
-def cache_response(expire_time=300, key_prefix="cache"):
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            cache_key = f"{key_prefix}:{f.__name__}:{hash(str(args) + str(kwargs))}"
-            
-            cached_response = redis_client.get(cache_key)
-            if cached_response:
-                cached_data = json.loads(cached_response)
-                if isinstance(cached_data, dict) and 'data' in cached_data:
-                    from flask import jsonify
-                    return jsonify(cached_data['data']), cached_data.get('status_code', 200)
-                else:
-                    return cached_data
-            
-            result = f(*args, **kwargs)
-            
-            if isinstance(result, tuple):
-                response_data, status_code = result
-            else:
-                response_data, status_code = result, 200
-            
-            cache_data = {
-                'data': response_data.get_json() if hasattr(response_data, 'get_json') else response_data,
-                'status_code': status_code
-            }
-            
-            redis_client.setex(cache_key, expire_time, json.dumps(cache_data))
-            
-            return result
-        return decorated_function
-    return decorator
+def is_warming_request():
+    return has_request_context() and bool(request.environ.get(WARMER_ENVIRON_KEY))
+
+TAG_SET_TTL = 86400  # outlives any cache entry it indexes
+
+def tag_key(tag):
+    return f"tag:{tag}"
+
+def resolve_tags(tags, args, kwargs):
+    """Tags are literal strings or templates formatted with the view args, e.g. 'quiz:{quiz_id}'"""
+    if callable(tags):
+        return list(tags(*args, **kwargs))
+    return [tag.format(**kwargs) for tag in tags]
+
+# Compare-and-delete so a worker whose lease ran out never releases a successor's lock
+_RELEASE_LOCK_SCRIPT = redis_client.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+)
+LOCK_POLL_INTERVAL = 0.05
+# Stored bodies at least this large are gzipped once, at write time
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+def _acquire_recompute_lock(cache_key, lease):
+    token = uuid.uuid4().hex
+    try:
+        if redis_client.set(f"{cache_key}:lock", token, nx=True, px=int(lease * 1000)):
+            return token
+    except RedisError:
+        pass
+    return None
+
+def _release_recompute_lock(cache_key, token):
+    try:
+        _RELEASE_LOCK_SCRIPT(keys=[f"{cache_key}:lock"], args=[token])
+    except RedisError:
+        pass
+
+# Not replayed from a stored entry: hop-by-hop headers, those the cache sets itself,
+# and those describing this one request rather than the resource
+UNCACHED_HEADERS = frozenset((
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'proxy-connection',
+    'te', 'trailer', 'transfer-encoding', 'upgrade',
+    'content-type', 'content-length', 'content-encoding',
+    'date', 'set-cookie', 'server-timing', 'x-response-time',
+    'ratelimit-limit', 'ratelimit-remaining', 'ratelimit-reset', 'retry-after',
+))
+
+def _read_entry(cache_key):
+    """The stored response as a dict, or None. The body is kept as raw bytes, never JSON decoded."""
+    fields = redis_binary_client.hgetall(cache_key)
+    if not fields:
+        return None
+    return {
+        'body': fields[b'body'],
+        'encoding': fields.get(b'encoding', b'').decode(),
+        'status': int(fields[b'status']),
+        'content_type': fields[b'content_type'].decode(),
+        'headers': [tuple(header) for header in json.loads(fields.get(b'headers', b'[]'))],
+        'fresh_until': float(fields[b'fresh_until']),
+        'delta': float(fields.get(b'delta', 0)),
+    }
+
+def _encode_entry(response, expire_time, delta):
+    body = response.get_data()
+    entry = {
+        'body': body,
+        'encoding': '',
+        'status': response.status_code,
+        'content_type': response.content_type,
+        'headers': [(name, value) for name, value in response.headers if name.lower() not in UNCACHED_HEADERS],
+        'fresh_until': time.time() + expire_time,
+        'delta': round(delta, 4),
+    }
+    if len(body) >= COMPRESS_MIN_BYTES:
+        entry['body'] = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        entry['encoding'] = 'gzip'
+    return entry
+
+def _fresh_beyond_warm_margin(cache_key):
+    """Whether an entry stays fresh for longer than CACHE_WARM_MARGIN, so the warmer can skip it"""
+    try:
+        fresh_until = redis_binary_client.hget(cache_key, 'fresh_until')
+    except RedisError:
+        return False
+    margin = current_app.config.get('CACHE_WARM_MARGIN', 240)
+    return fresh_until is not None and float(fresh_until) - time.time() > margin
+
+def _wait_for_entry(cache_key, timeout):
+    """Poll for the entry another worker is computing; None if it does not appear in time"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            entry = _read_entry(cache_key)
+        except RedisError:
+            return None
+        if entry:
+            return entry
+    return None
+
+def _should_refresh_early(entry, now, beta):
+    """
+    XFetch: refresh ahead of expiry with a probability that rises as expiry nears
+    and with how long the value took to compute (delta), so one request
+    usually recomputes before the entry ever goes stale.
+    """
+    if not beta:
+        return False
+    return now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['fresh_until']
+
+def _entry_response(entry):
+    """
+    Write the stored bytes straight out with the view's own headers (Cache-Control, Vary, ...);
+    compressed bodies are passed through when the client accepts gzip
+    """
+    body = entry['body']
+    response = current_app.response_class(status=entry['status'], headers=entry['headers'],
+                                          content_type=entry['content_type'])
+    if entry['encoding'] == 'gzip':
+        response.vary.add('Accept-Encoding')
+        if 'gzip' in request.accept_encodings:
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            body = gzip.decompress(body)
+    response.set_data(body)
+    return response
+
+def _recompute(f, args, kwargs, cache_key, policy, tags, local_cache, generation, token, endpoint, counters):
+    """
+    Run the view and store its response; releases the recompute lock if we hold it.
+    counters (the lookup outcome) are recorded together with the recompute cost.
+    """
+    try:
+        started = time.perf_counter()
+        response = current_app.make_response(f(*args, **kwargs))
+        delta = time.perf_counter() - started
+        counters.update(recomputes=1, recompute_ms=delta * 1000)
+        
+        # Only successful, fully buffered responses are cached
+        if response.status_code >= 400 or response.is_streamed:
+            record_cache_event(endpoint, **counters)
+            return response
+        
+        entry = _encode_entry(response, policy['expire_time'], delta)
+        if entry['encoding']:
+            response.vary.add('Accept-Encoding')
+        counters['bytes'] = len(entry['body'])
+        record_cache_event(endpoint, **counters)
+        try:
+            pipe = redis_binary_client.pipeline(transaction=False)
+            pipe.delete(cache_key)
+            pipe.hset(cache_key, mapping={**entry, 'headers': json.dumps(entry['headers'])})
+            # Kept past its freshness so it can be served while one worker recomputes
+            pipe.expire(cache_key, policy['expire_time'] + policy['stale_for'])
+            for tag in tags:
+                pipe.sadd(tag_key(tag), cache_key)
+                pipe.expire(tag_key(tag), TAG_SET_TTL)
+            pipe.execute()
+        except RedisError:
+            return response
+        if local_cache is not None:
+            local_cache.set(cache_key, entry, policy['expire_time'], generation)
+        return response
+    finally:
+        if token is not None:
+            _release_recompute_lock(cache_key, token)
+
+def _cached_call(f, args, kwargs, cache_key, policy, endpoint, tags=(), local_cache=None):
+    generation = None
+    if local_cache is not None:
+        cached_data = local_cache.get(cache_key)
+        if cached_data is not None:
+            record_cache_event(endpoint, hits=1, l1_hits=1)
+            return _entry_response(cached_data)
+        generation = local_cache.generation
+
+    try:
+        entry = _read_entry(cache_key)
+    except RedisError:
+        return f(*args, **kwargs)
+    
+    if entry is not None:
+        now = time.time()
+        fresh_until = entry['fresh_until']
+        if now < fresh_until and not _should_refresh_early(entry, now, policy['early_refresh_beta']):
+            if local_cache is not None:
+                local_cache.set(cache_key, entry, fresh_until - now, generation)
+            record_cache_event(endpoint, hits=1)
+            return _entry_response(entry)
+        # Stale (or picked for early refresh): one worker recomputes, the rest keep serving this copy
+        token = _acquire_recompute_lock(cache_key, policy['lock_lease'])
+        if token is None:
+            record_cache_event(endpoint, stale=1)
+            return _entry_response(entry)
+        return _recompute(f, args, kwargs, cache_key, policy, tags, local_cache, generation, token,
+                          endpoint, {'hits' if now < fresh_until else 'stale': 1})
+    
+    # Cold miss: one worker computes while the others wait briefly for its result
+    token = _acquire_recompute_lock(cache_key, policy['lock_lease'])
+    if token is None and policy['lock_wait'] > 0:
+        entry = _wait_for_entry(cache_key, policy['lock_wait'])
+        if entry is not None:
+            record_cache_event(endpoint, misses=1)
+            return _entry_response(entry)
+    return _recompute(f, args, kwargs, cache_key, policy, tags, local_cache, generation, token,
+                      endpoint, {'misses': 1})
+
+def cache_response(expire_time=300, key_prefix="cache", vary_query=None, vary_headers=(), vary_user=False,
+                   tags=(), local=True, stale_for=60, lock_lease=30, lock_wait=2.0, early_refresh_beta=None):
+    """
+    Cache a view's response in Redis as the final body bytes (gzipped once when
+    large) plus status, content type and the view's headers (less hop-by-hop
+    and per-request ones, see UNCACHED_HEADERS), so a hit never touches a JSON encoder.
+    The key is a stable digest of the endpoint, view args and query args
+    (vary_query=None means all of them, or list the names that matter),
+    plus any headers named in vary_headers and the user when vary_user is set.
+    The entry is registered under each of its tags (user scoped entries also
+    under user:<id>) so invalidate_tags() can drop exactly what a write affects.
+    With CACHE_L1_ENABLED, hits are also kept in the worker's in-process LRU
+    unless local=False. Hits, misses, stale serves, recompute time and payload
+    size are counted per endpoint (see backend.utils.cache_metrics).
+
+    Stampede protection: an entry stays in Redis for stale_for seconds past
+    expire_time. Only the worker holding the recompute lock (a lease of
+    lock_lease seconds) refreshes it; the others serve the stale copy, or on a
+    cold miss wait up to lock_wait seconds for the result. early_refresh_beta
+    (e.g. 1.0) enables XFetch probabilistic refresh ahead of expiry.
+    """
+    policy = {
+        'expire_time': expire_time,
+        'stale_for': stale_for,
+        'lock_lease': lock_lease,
+        'lock_wait': lock_wait,
+        'early_refresh_beta': early_refresh_beta,
+    }
 
-def cache_user_specific(expire_time=300):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user_id = getattr(g, 'user_id', 'anonymous') if hasattr(g, 'user_id') else 'anonymous'
-            cache_key = f"cache:user:{user_id}:{f.__name__}:{hash(str(args) + str(kwargs))}"
-            
-            cached_response = redis_client.get(cache_key)
-            if cached_response:
-                cached_data = json.loads(cached_response)
-                if isinstance(cached_data, dict) and 'data' in cached_data:
-                    from flask import jsonify
-                    return jsonify(cached_data['data']), cached_data.get('status_code', 200)
-                else:
-                    return cached_data
-            
-            result = f(*args, **kwargs)
-            
-            if isinstance(result, tuple):
-                response_data, status_code = result
-            else:
-                response_data, status_code = result, 200
-            
-            cache_data = {
-                'data': response_data.get_json() if hasattr(response_data, 'get_json') else response_data,
-                'status_code': status_code
-            }
-            
-            redis_client.setex(cache_key, expire_time, json.dumps(cache_data))
-            
-            return result
+            cache_key = build_cache_key(key_prefix, f, args, kwargs, vary_query, vary_headers, vary_user)
+            entry_tags = resolve_tags(tags, args, kwargs)
+            if vary_user:
+                entry_tags.append(f"user:{getattr(g, 'user_id', None) or 'anonymous'}")
+            local_cache = get_local_cache() if local else None
+            endpoint = (request.endpoint if has_request_context() else None) or f.__qualname__
+            if is_warming_request():
+                # Only missing entries and those expiring before the next warm run are recomputed;
+                # 204 tells the warmer the entry was left alone
+                if _fresh_beyond_warm_margin(cache_key):
+                    return current_app.response_class(status=204)
+                return _recompute(f, args, kwargs, cache_key, policy, entry_tags, local_cache,
+                                  local_cache.generation if local_cache else None, None, endpoint, {})
+            return _cached_call(f, args, kwargs, cache_key, policy, endpoint, entry_tags, local_cache)
         return decorated_function
     return decorator
 
-def invalidate_cache(pattern="cache:*"):
+def cache_user_specific(expire_time=300, vary_query=None, vary_headers=(), tags=(), local=True, **options):
+    """cache_response scoped to the current user (g.user_id)"""
+    return cache_response(expire_time, key_prefix="cache", vary_query=vary_query,
+                          vary_headers=vary_headers, vary_user=True, tags=tags, local=local, **options)
+
+def _store_swr_entry(key, value, fresh_for, stale_for):
+    entry = {'value': value, 'computed_at': time.time()}
+    redis_client.setex(key, fresh_for + stale_for, json.dumps(entry))
+
+def _refresh_swr_entry(app, key, fresh_for, stale_for, compute):
+    try:
+        with app.app_context():
+            _store_swr_entry(key, compute(), fresh_for, stale_for)
+    except Exception as e:
+        app.logger.warning(f"Failed to refresh cached value {key}: {e}")
+    finally:
+        try:
+            redis_client.delete(f"{key}:refreshing")
+        except RedisError:
+            pass
+
+def stale_while_revalidate(key, compute, fresh_for=30, stale_for=300):
+    """
+    Return the cached result of compute() under key.
+    Within fresh_for seconds the value is served as is; for a further stale_for
+    seconds it is still served while one worker recomputes it in the background.
+    Only a cold (or fully expired) key runs compute() on the request path.
+    """
+    try:
+        cached = redis_client.get(key)
+    except RedisError:
+        return compute()
+
+    if cached:
+        entry = json.loads(cached)
+        if time.time() - entry['computed_at'] >= fresh_for:
+            try:
+                if redis_client.set(f"{key}:refreshing", 1, nx=True, ex=max(fresh_for, 10)):
+                    threading.Thread(
+                        target=_refresh_swr_entry,
+                        args=(current_app._get_current_object(), key, fresh_for, stale_for, compute),
+                        daemon=True
+                    ).start()
+            except RedisError:
+                pass
+        return entry['value']
+
+    value = compute()
+    try:
+        _store_swr_entry(key, value, fresh_for, stale_for)
+    except RedisError:
+        pass
+    return value
+
+def invalidate_tags(*tags):
+    """Delete every cache entry registered under any of the tags, plus the tag sets themselves"""
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return 0
+    try:
+        redis_client = get_redis_client()
+        tag_keys = [tag_key(tag) for tag in tags]
+        keys = redis_client.sunion(tag_keys)
+        pipe = redis_client.pipeline(transaction=False)
+        if keys:
+            pipe.unlink(*keys)
+            # Every worker's L1 drops the same keys
+            pipe.publish(INVALIDATION_CHANNEL, invalidation_message(keys))
+        pipe.delete(*tag_keys)
+        deleted = pipe.execute()[0] if keys else 0
+    except RedisError:
+        return 0
+    if has_request_context():
+        # Picked up by schedule_warm_after_invalidation
+        g.cache_invalidated = True
+    if keys and _local_cache is not None:
+        _local_cache.delete(*keys)
+    return deleted
+
+def invalidate_cache(*tags):
+    """Invalidate the given tags (templates formatted with the view args) after a successful write"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             result = f(*args, **kwargs)
             
-            try:
-                redis_client = get_redis_client()
-                keys = redis_client.keys(pattern)
-                if keys:
-                    redis_client.delete(*keys)
-            except RedisError:
-                pass
+            status_code = result[1] if isinstance(result, tuple) and len(result) > 1 else getattr(result, 'status_code', 200)
+            if status_code < 400:
+                invalidate_tags(*resolve_tags(tags, args, kwargs))
             
             return result
         return decorated_function
     return decorator
 
-def rate_limit(requests_per_minute=60):
+RATE_LIMIT_PERIOD_MS = 60000
+
+# GCRA over a shared per-client budget, decided and updated in one EVALSHA.
+# Each call charges period * cost / limit ms of "debt" (the theoretical arrival
+# time, TAT, runs ahead of now); it is allowed while the debt stays within one
+# period. Endpoints with lower limits or higher costs charge more of the budget.
+# ARGV[4] carries charges a worker already allowed locally; they always apply.
+_GCRA_SCRIPT = redis_client.register_script("""
+local period = tonumber(ARGV[1])
+local increment = tonumber(ARGV[2])
+local emission = tonumber(ARGV[3])
+local pending = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+tat = tat + pending
+local new_tat = tat + increment
+if new_tat - now > period then
+    if pending > 0 then
+        redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+    end
+    return {0, math.max(0, math.floor((period - (tat - now)) / emission)), math.ceil(new_tat - now - period), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor((period - (new_tat - now)) / emission), 0, math.ceil(new_tat - now)}
+""")
+
+RateLimitDecision = namedtuple('RateLimitDecision', 'allowed limit remaining reset_ms retry_after_ms')
+
+# Per-worker counters: decisions made locally vs. synced with Redis, and Redis outages
+# (also summed across workers in the daily stats:ratelimit hash)
+rate_limit_counters = dict.fromkeys(
+    ('local_allowed', 'local_rejected', 'synced', 'rejected', 'fail_open', 'fail_closed'), 0
+)
+_rate_limit_counters_lock = threading.Lock()
+_local_rate_limiter = None
+_local_rate_limiter_pid = None
+_last_outage_log = 0
+
+def _count_rate_limit(name):
+    with _rate_limit_counters_lock:
+        rate_limit_counters[name] += 1
+    record_rate_limit_event(name)
+
+def get_local_rate_limiter():
+    """The worker's in-process pre-filter, or None when RATE_LIMIT_LOCAL_FRACTION is 0"""
+    global _local_rate_limiter, _local_rate_limiter_pid
+    config = current_app.config
+    if not config.get('RATE_LIMIT_LOCAL_FRACTION'):
+        return None
+    if _local_rate_limiter_pid != os.getpid():
+        with _rate_limit_counters_lock:
+            if _local_rate_limiter_pid != os.getpid():
+                _local_rate_limiter = LocalRateLimiter(
+                    RATE_LIMIT_PERIOD_MS,
+                    local_fraction=config['RATE_LIMIT_LOCAL_FRACTION'],
+                    sync_interval=config.get('RATE_LIMIT_SYNC_INTERVAL', 1.0)
+                )
+                _local_rate_limiter_pid = os.getpid()
+    return _local_rate_limiter
+
+def check_rate_limit(identifier, requests_per_minute, cost=1):
+    """
+    Charge cost requests against the client's budget. Decided in process when the
+    local estimate allows it, otherwise with one EVALSHA that also settles the
+    charges allowed locally since the last sync. Raises RedisError if Redis is unavailable.
+    """
+    emission = RATE_LIMIT_PERIOD_MS / requests_per_minute
+    increment = int(emission * cost)
+    limiter = get_local_rate_limiter()
+    pending = 0
+    if limiter is not None:
+        local = limiter.try_local(identifier, increment)
+        if local is not None:
+            allowed, debt = local
+            _count_rate_limit('local_allowed' if allowed else 'local_rejected')
+            remaining = max(0, int((RATE_LIMIT_PERIOD_MS - debt) // emission))
+            retry_after_ms = 0 if allowed else debt + increment - RATE_LIMIT_PERIOD_MS
+            return RateLimitDecision(allowed, requests_per_minute, remaining, debt, retry_after_ms)
+        pending = limiter.take_pending(identifier)
+
+    try:
+        allowed, remaining, retry_after_ms, reset_ms = _GCRA_SCRIPT(
+            keys=[f"rate_limit:{identifier}"],
+            args=[RATE_LIMIT_PERIOD_MS, increment, emission, pending]
+        )
+    except RedisError:
+        if limiter is not None:
+            limiter.restore_pending(identifier, pending)
+        raise
+    _count_rate_limit('synced' if allowed else 'rejected')
+    if limiter is not None:
+        limiter.record_sync(identifier, reset_ms)
+    return RateLimitDecision(bool(allowed), requests_per_minute, remaining, reset_ms, retry_after_ms)
+
+def set_rate_limit_headers(response, decision):
+    response.headers['RateLimit-Limit'] = str(decision.limit)
+    response.headers['RateLimit-Remaining'] = str(decision.remaining)
+    response.headers['RateLimit-Reset'] = str(math.ceil(decision.reset_ms / 1000))
+    if not decision.allowed:
+        response.headers['Retry-After'] = str(max(1, math.ceil(decision.retry_after_ms / 1000)))
+    return response
+
+def _rate_limiter_unavailable(error):
+    """Apply RATE_LIMIT_FAIL_MODE: None lets the request through (open), else the 503 to return (closed)"""
+    global _last_outage_log
+    fail_closed = current_app.config.get('RATE_LIMIT_FAIL_MODE', 'open') == 'closed'
+    _count_rate_limit('fail_closed' if fail_closed else 'fail_open')
+    if time.monotonic() - _last_outage_log >= 60:
+        _last_outage_log = time.monotonic()
+        current_app.logger.warning(
+            f"Rate limiter unavailable, failing {'closed' if fail_closed else 'open'}: {error}"
+        )
+    if not fail_closed:
+        return None
+    response = jsonify({'message': 'Service temporarily unavailable'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+def rate_limit(requests_per_minute=60, cost=1):
+    """
+    Limit each client (IP + user) to requests_per_minute of this endpoint, from a
+    budget shared across endpoints; cost weights expensive endpoints.
+    Responses carry RateLimit-Limit / -Remaining / -Reset headers.
+    When Redis is unavailable RATE_LIMIT_FAIL_MODE decides: 'open' serves the
+    request, 'closed' answers 503; both are counted in rate_limit_counters.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            if is_warming_request():
+                return f(*args, **kwargs)
             try:
-                redis_client = get_redis_client()
-                identifier = get_client_identifier()
-                current_window = get_current_window()
-                key = f"rate_limit:{identifier}:{current_window}"
-                
-                current_requests = redis_client.get(key)
-                if current_requests and int(current_requests) >= requests_per_minute:
-                    return jsonify({'message': 'Rate limit exceeded'}), 429
-                
-                pipe = redis_client.pipeline()
-                pipe.incr(key)
-                pipe.expire(key, 60)
-                pipe.execute()
-                
-            except RedisError:
-                pass
+                decision = check_rate_limit(get_client_identifier(), requests_per_minute, cost)
+            except RedisError as e:
+                unavailable = _rate_limiter_unavailable(e)
+                return f(*args, **kwargs) if unavailable is None else unavailable
             
-            return f(*args, **kwargs)
+            if not decision.allowed:
+                response = jsonify({'message': 'Rate limit exceeded'})
+                response.status_code = 429
+                return set_rate_limit_headers(response, decision)
+            
+            return set_rate_limit_headers(current_app.make_response(f(*args, **kwargs)), decision)
         return decorated_function
     return decorator
 
+def _unlink_matching(redis_client, pattern, batch_size=500):
+    # SCAN in batches rather than KEYS so Redis is never blocked on the whole keyspace
+    deleted = 0
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted += redis_client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += redis_client.unlink(*batch)
+    return deleted
+
 def clear_all_cache():
     try:
         redis_client = get_redis_client()
-        keys = redis_client.keys("cache:*")
-        if keys:
-            deleted = redis_client.delete(*keys)
-            return deleted
-        return 0
+        deleted = _unlink_matching(redis_client, "cache:*")
+        _unlink_matching(redis_client, "tag:*")
+        redis_client.publish(INVALIDATION_CHANNEL, INVALIDATE_ALL)
     except RedisError:
         return 0
+    if _local_cache is not None:
+        _local_cache.clear()
+    return deleted
 
 def get_cache_stats():
     try:
@@ -153,24 +602,9 @@ def get_cache_stats():
         return {
             'cache_entries': len(cache_keys),
             'rate_limit_entries': len(rate_limit_keys),
+            'rate_limiter': dict(rate_limit_counters),
             'total_memory': redis_client.info()['used_memory_human'],
             'redis_version': redis_client.info()['redis_version']
         }
     except RedisError:
         return {}
-
-def warm_cache(patterns):
-    try:
-        redis_client = get_redis_client()
-        warmed_keys = []
-        
-        for pattern in patterns:
-            keys = redis_client.keys(pattern)
-            warmed_keys.extend(keys)
-        
-        return {
-            'warmed_keys': len(warmed_keys),
-            'patterns': patterns
-        }
-    except RedisError:
-        return {} 
\ No newline at end of file
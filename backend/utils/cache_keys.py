@@ -0,0 +1,43 @@
+"""
+Cache Key Derivation
+Deterministic cache keys from a canonical form of the request, stable across workers and restarts
+"""
+import hashlib
+import json
+from flask import request, g, has_request_context
+
+KEY_VERSION = 'v3'  # v2: entries are hashes of pre-serialized bytes; v3: plus the view's headers
+
+def _scope_user_id():
+    return getattr(g, 'user_id', None) or 'anonymous'
+
+def canonical_request(f, args, kwargs, vary_query=None, vary_headers=(), vary_user=False):
+    """
+    The parts of a call that select a distinct cached response:
+    endpoint, view args, query args (all, or only the names in vary_query),
+    the headers named in vary_headers and, with vary_user, the user id.
+    """
+    parts = {
+        'endpoint': f"{f.__module__}.{f.__qualname__}",
+        'args': [repr(arg) for arg in args],
+        'view_args': {name: repr(value) for name, value in sorted(kwargs.items())},
+    }
+    if has_request_context():
+        parts['endpoint'] = request.endpoint or parts['endpoint']
+        query = request.args
+        names = sorted(query.keys()) if vary_query is None else sorted(vary_query)
+        parts['query'] = [[name, sorted(query.getlist(name))] for name in names if name in query]
+        parts['headers'] = {name.lower(): request.headers.get(name, '') for name in sorted(vary_headers)}
+    if vary_user:
+        parts['user'] = str(_scope_user_id())
+    return parts
+
+def digest(parts):
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+def build_cache_key(key_prefix, f, args, kwargs, vary_query=None, vary_headers=(), vary_user=False):
+    """<prefix>:<version>:<endpoint>:<digest>, or <prefix>:user:<id>:<version>:<endpoint>:<digest> when user scoped"""
+    parts = canonical_request(f, args, kwargs, vary_query, vary_headers, vary_user)
+    scope = f"user:{_scope_user_id()}:" if vary_user else ''
+    return f"{key_prefix}:{scope}{KEY_VERSION}:{parts['endpoint']}:{digest(parts)}"
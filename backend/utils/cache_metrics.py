@@ -0,0 +1,64 @@
+"""
+Cache Effectiveness Metrics
+Per-endpoint hit, miss, stale and recompute counters for cache_response, kept in
+one Redis hash per day and written through the buffered metrics pipeline
+"""
+import time
+from collections import defaultdict
+from backend.utils.metrics_buffer import get_metrics_buffer
+
+CACHE_METRICS_TTL = 8 * 86400  # a week of history plus today
+CACHE_COUNTERS = ('hits', 'l1_hits', 'misses', 'stale', 'recomputes', 'recompute_ms', 'bytes')
+
+def cache_metrics_key(day=None):
+    return f"stats:cache:{day or time.strftime('%Y-%m-%d')}"
+
+def rate_limit_metrics_key(day=None):
+    return f"stats:ratelimit:{day or time.strftime('%Y-%m-%d')}"
+
+def record_rate_limit_event(outcome):
+    """Count one rate limit decision by outcome (local_allowed, synced, rejected, fail_open, ...)"""
+    get_metrics_buffer().incr(rate_limit_metrics_key(), outcome, 1, ttl=CACHE_METRICS_TTL)
+
+def record_cache_event(endpoint, **counters):
+    """Add the given counter increments for endpoint, e.g. record_cache_event('admin.get_subjects', hits=1)"""
+    buffer = get_metrics_buffer()
+    key = cache_metrics_key()
+    for name, amount in counters.items():
+        buffer.incr(key, f"{endpoint}:{name}", amount, ttl=CACHE_METRICS_TTL)
+
+def _summarize(counters):
+    lookups = counters['hits'] + counters['misses'] + counters['stale']
+    return {
+        **{name: round(counters[name], 2) if name == 'recompute_ms' else int(counters[name]) for name in CACHE_COUNTERS},
+        'lookups': int(lookups),
+        'hit_ratio': round((counters['hits'] + counters['stale']) / lookups, 4) if lookups else None,
+        'avg_recompute_ms': round(counters['recompute_ms'] / counters['recomputes'], 2) if counters['recomputes'] else None,
+        'avg_payload_bytes': int(counters['bytes'] / counters['recomputes']) if counters['recomputes'] else None,
+    }
+
+def get_cache_metrics(days=1):
+    """Counters per endpoint summed over the last N days, with derived hit ratio and averages"""
+    from backend.utils.cache import get_redis_client
+    get_metrics_buffer().flush()
+    days = max(1, days)
+    pipe = get_redis_client().pipeline(transaction=False)
+    for i in range(days):
+        pipe.hgetall(cache_metrics_key(time.strftime('%Y-%m-%d', time.localtime(time.time() - i * 86400))))
+
+    endpoints = defaultdict(lambda: dict.fromkeys(CACHE_COUNTERS, 0))
+    for fields in pipe.execute():
+        for field, value in fields.items():
+            endpoint, name = field.rsplit(':', 1)
+            if name in CACHE_COUNTERS:
+                endpoints[endpoint][name] += float(value)
+
+    totals = dict.fromkeys(CACHE_COUNTERS, 0)
+    for counters in endpoints.values():
+        for name in CACHE_COUNTERS:
+            totals[name] += counters[name]
+    return {
+        'days': days,
+        'totals': _summarize(totals),
+        'endpoints': {endpoint: _summarize(counters) for endpoint, counters in sorted(endpoints.items())},
+    }
@@ -0,0 +1,115 @@
+"""
+Cache Warmer
+Renders a declared manifest of cacheable endpoints through the app's test client
+(and the user quiz payload snapshots directly) so the first real request after a
+deploy or an invalidation is served from cache. Entries that stay fresh past the
+next run are left alone, so a run only recomputes what is missing or expiring.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from flask import g, has_request_context, current_app
+from redis.exceptions import RedisError
+from backend.extensions import db
+from backend.models.model import User, Quiz, QuizResult
+from backend.utils.cache import get_redis_client, WARMER_ENVIRON_KEY
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+WARM_SCHEDULED_KEY = 'cache:warm:scheduled'
+WARM_DEBOUNCE_SECONDS = 5
+WARM_UPCOMING_QUIZ_LIMIT = 200
+
+def upcoming_quiz_ids(limit=WARM_UPCOMING_QUIZ_LIMIT):
+    today = datetime.now(IST).date()
+    return list(db.session.scalars(
+        db.select(Quiz.id).where(Quiz.date_of_quiz >= today).order_by(Quiz.date_of_quiz, Quiz.id).limit(limit)
+    ))
+
+def active_student_ids(days, limit):
+    """Students who submitted a quiz in the last days, most recent first"""
+    since = datetime.now(IST) - timedelta(days=days)
+    last_taken = db.func.max(QuizResult.date_taken)
+    return list(db.session.scalars(
+        db.select(QuizResult.user_id)
+        .join(User, User.id == QuizResult.user_id)
+        .where(QuizResult.date_taken >= since, User.is_admin.is_(False))
+        .group_by(QuizResult.user_id)
+        .order_by(last_taken.desc())
+        .limit(limit)
+    ))
+
+def _admin_ids():
+    return [db.session.scalar(db.select(User.id).where(User.is_admin.is_(True)).order_by(User.id).limit(1))]
+
+def _student_ids():
+    config = current_app.config
+    return active_student_ids(config.get('CACHE_WARM_ACTIVE_DAYS', 7), config.get('CACHE_WARM_MAX_STUDENTS', 500))
+
+# (path, users to request it as); user scoped entries are warmed once per user
+WARM_MANIFEST = (
+    ('/api/admin/subjects', _admin_ids),
+    ('/api/user/quizzes', _student_ids),
+)
+
+def warm_quiz_snapshots(quiz_ids):
+    """Render the user-facing payload snapshot of each quiz; returns how many exist"""
+    from backend.utils.snapshots import get_quiz_snapshot
+    return sum(1 for quiz_id in quiz_ids if get_quiz_snapshot(quiz_id) is not None)
+
+def _manifest_requests(manifest):
+    for path, users in manifest:
+        for user_id in users():
+            if user_id is not None:
+                yield path, user_id
+
+def warm_cache(app, manifest=WARM_MANIFEST):
+    """
+    Request every manifest path as each of its users and render the snapshot of
+    every upcoming quiz. Responses still fresh for longer than CACHE_WARM_MARGIN
+    are counted as fresh and not recomputed. Must be called inside an app context.
+    """
+    started = time.perf_counter()
+    warmed, fresh, failed = 0, 0, []
+
+    client = app.test_client()
+    client.environ_base[WARMER_ENVIRON_KEY] = True
+    for path, user_id in _manifest_requests(manifest):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = False
+        response = client.get(path)
+        if response.status_code >= 400:
+            failed.append({'path': path, 'user_id': user_id, 'status_code': response.status_code})
+        elif response.status_code == 204:
+            fresh += 1
+        else:
+            warmed += 1
+
+    snapshots = warm_quiz_snapshots(upcoming_quiz_ids())
+    return {
+        'warmed': warmed,
+        'fresh': fresh,
+        'failed': failed,
+        'snapshots': snapshots,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+def schedule_cache_warm(delay=WARM_DEBOUNCE_SECONDS):
+    """Queue one warm run shortly after a burst of edits; further calls within delay are no-ops"""
+    try:
+        if not get_redis_client().set(WARM_SCHEDULED_KEY, 1, nx=True, ex=delay):
+            return False
+    except RedisError:
+        return False
+    try:
+        from backend.tasks import warm_response_cache
+        warm_response_cache.apply_async(countdown=delay, retry=False)
+        return True
+    except Exception:
+        return False
+
+def schedule_warm_after_invalidation(response):
+    """after_request hook: re-warm once a write has invalidated cached responses"""
+    if has_request_context() and g.get('cache_invalidated') and response.status_code < 400:
+        schedule_cache_warm()
+    return response
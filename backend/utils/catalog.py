@@ -0,0 +1,50 @@
+"""
+Quiz Catalog Loader
+Fetches quizzes with their chapter, subject and question ids in a fixed number of queries
+"""
+from collections import defaultdict
+from sqlalchemy.orm import joinedload
+from backend.extensions import db
+from backend.models.model import Quiz, Chapter, Question
+
+def load_question_ids(quiz_ids=None):
+    """Map quiz_id -> ordered list of question ids using a single query"""
+    query = db.session.query(Question.quiz_id, Question.id)
+    if quiz_ids is not None:
+        query = query.filter(Question.quiz_id.in_(quiz_ids))
+
+    question_ids = defaultdict(list)
+    for quiz_id, question_id in query.order_by(Question.quiz_id, Question.id):
+        question_ids[quiz_id].append(question_id)
+    return question_ids
+
+def serialize_catalog_quiz(quiz, question_ids):
+    """Serialize a quiz whose chapter and subject are already loaded"""
+    chapter = quiz.chapter
+    return {
+        'id': quiz.id,
+        'questions': [{'id': question_id} for question_id in question_ids],
+        'question_count': len(question_ids),
+        'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
+        'time_duration': quiz.time_duration,
+        'chapter': {
+            'id': chapter.id,
+            'name': chapter.name,
+            'subject': {
+                'id': chapter.subject.id,
+                'name': chapter.subject.name
+            } if chapter.subject else None
+        } if chapter else None
+    }
+
+def load_quiz_catalog():
+    """
+    Load the full quiz catalog in two queries regardless of its size:
+    quizzes joined with chapter and subject, then all question ids.
+    """
+    quizzes = Quiz.query.options(
+        joinedload(Quiz.chapter).joinedload(Chapter.subject)
+    ).order_by(Quiz.date_of_quiz, Quiz.id).all()
+
+    question_ids = load_question_ids()
+    return [serialize_catalog_quiz(quiz, question_ids.get(quiz.id, [])) for quiz in quizzes]
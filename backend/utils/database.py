@@ -0,0 +1,75 @@
+"""
+Database Engine Configuration
+Builds SQLAlchemy engine options from app config and applies SQLite pragmas on connect
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+def normalize_database_url(url):
+    # Hosted Postgres providers still hand out the deprecated postgres:// scheme
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+def is_sqlite_memory(url):
+    database = make_url(url).database
+    return is_sqlite(url) and (not database or database == ':memory:' or 'mode=memory' in url)
+
+def is_postgres(url):
+    return make_url(url).get_backend_name() == 'postgresql'
+
+def build_engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URL"""
+    url = config['SQLALCHEMY_DATABASE_URI']
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    # In-memory SQLite runs on a single static connection, so pool sizing does not apply
+    if not is_sqlite_memory(url):
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', True)
+
+    if is_postgres(url):
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('application_name', config['PG_APPLICATION_NAME'])
+        connect_args.setdefault('options', f"-c statement_timeout={config['PG_STATEMENT_TIMEOUT_MS']}")
+
+    return options
+
+def sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    ]
+
+def configure_database(app):
+    """Resolve the database URL and engine options; call before db.init_app(app)"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
+
+def register_engine_events(app, engine):
+    """Apply connect-time settings to every new DBAPI connection of the engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+    if is_sqlite_memory(app.config['SQLALCHEMY_DATABASE_URI']):
+        # WAL and mmap do not apply to in-memory databases
+        pragmas = [p for p in pragmas if not p.startswith(('PRAGMA journal_mode', 'PRAGMA mmap_size'))]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
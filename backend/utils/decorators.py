@@ -26,22 +26,22 @@ def user_context_middleware(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def secure_endpoint(rate_limit_requests: int = 60):
+def secure_endpoint(rate_limit_requests: int = 60, rate_limit_cost: int = 1):
     """Combined decorator for security: rate limiting + user context"""
     def decorator(f):
         @wraps(f)
-        @rate_limit(rate_limit_requests)
+        @rate_limit(rate_limit_requests, rate_limit_cost)
         @user_context_middleware
         def decorated_function(*args, **kwargs):
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-def admin_secure_endpoint(rate_limit_requests: int = 100):
+def admin_secure_endpoint(rate_limit_requests: int = 100, rate_limit_cost: int = 1):
     """Combined decorator for admin endpoints: admin check + rate limiting + user context"""
     def decorator(f):
         @wraps(f)
-        @rate_limit(rate_limit_requests)
+        @rate_limit(rate_limit_requests, rate_limit_cost)
         @user_context_middleware
         @admin_required
         def decorated_function(*args, **kwargs):
@@ -0,0 +1,89 @@
+"""
+Server-Side Grading
+Cached per-quiz answer keys and O(questions) grading of submitted answers
+"""
+import json
+from redis.exceptions import RedisError
+from backend.extensions import db
+from backend.models.model import Question
+from backend.utils.cache import get_redis_client
+
+ANSWER_KEY_TTL = 3600
+OPTION_LETTERS = 'ABCD'
+
+def answer_key_cache_key(quiz_id):
+    return f"cache:answer_key:{quiz_id}"
+
+def get_answer_key(quiz_id):
+    """Map question_id -> correct option (1-4), cached in Redis"""
+    redis_client = get_redis_client()
+    try:
+        cached = redis_client.get(answer_key_cache_key(quiz_id))
+        if cached:
+            return {int(question_id): option for question_id, option in json.loads(cached).items()}
+    except RedisError:
+        pass
+
+    answer_key = dict(
+        db.session.query(Question.id, Question.correct_option).filter(Question.quiz_id == quiz_id)
+    )
+    try:
+        redis_client.setex(answer_key_cache_key(quiz_id), ANSWER_KEY_TTL, json.dumps(answer_key))
+    except RedisError:
+        pass
+    return answer_key
+
+def invalidate_answer_key(quiz_id):
+    try:
+        get_redis_client().delete(answer_key_cache_key(quiz_id))
+    except RedisError:
+        pass
+
+def parse_option(value):
+    """Accept 1-4 or A-D; None means unanswered. Raises ValueError otherwise."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        text = value.strip().upper()
+        if len(text) == 1 and text in OPTION_LETTERS:
+            return OPTION_LETTERS.index(text) + 1
+        if not text.isdigit():
+            raise ValueError(f'Invalid option {value!r}')
+        option = int(text)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        option = value
+    else:
+        raise ValueError(f'Invalid option {value!r}')
+    if option < 1 or option > len(OPTION_LETTERS):
+        raise ValueError(f'Invalid option {value!r}')
+    return option
+
+def grade_answers(answer_key, answers):
+    """
+    Grade {question_id: option} against the answer key.
+    Returns (score as a rounded percentage, UserAnswer rows without quiz_result_id).
+    Raises ValueError for unknown question ids or invalid options.
+    """
+    chosen = {}
+    for question_id, value in answers.items():
+        if not str(question_id).isdigit():
+            raise ValueError(f'Invalid question id {question_id!r}')
+        question_id = int(question_id)
+        if question_id not in answer_key:
+            raise ValueError(f'Question {question_id} is not part of this quiz')
+        chosen[question_id] = parse_option(value)
+
+    rows = []
+    correct = 0
+    for question_id, correct_option in answer_key.items():
+        option = chosen.get(question_id)
+        is_correct = option is not None and option == correct_option
+        correct += is_correct
+        rows.append({
+            'question_id': question_id,
+            'user_answer': OPTION_LETTERS[option - 1] if option else None,
+            'is_correct': is_correct
+        })
+
+    score = int(correct * 100 / len(answer_key) + 0.5) if answer_key else 0
+    return score, rows
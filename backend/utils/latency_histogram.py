@@ -0,0 +1,87 @@
+"""
+Latency Histograms
+Fixed log-scale buckets (HDR-style): every power of two between LOWEST_MS and
+HIGHEST_MS is split into SUB_BUCKETS buckets, so a reported percentile is at
+most ~9% above the true value at any scale. Because the bucket boundaries never
+change, histograms from different workers and days merge by adding counts.
+"""
+import math
+
+LOWEST_MS = 0.5
+HIGHEST_MS = 120000
+SUB_BUCKETS = 8
+MAX_BUCKET = math.ceil(math.log2(HIGHEST_MS / LOWEST_MS) * SUB_BUCKETS)
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+def bucket_index(value_ms):
+    """The bucket a latency falls into; values outside [LOWEST_MS, HIGHEST_MS] land in the edge buckets"""
+    if value_ms <= LOWEST_MS:
+        return 0
+    return min(MAX_BUCKET, math.ceil(math.log2(value_ms / LOWEST_MS) * SUB_BUCKETS))
+
+def bucket_upper_bound(index):
+    return LOWEST_MS * 2 ** (index / SUB_BUCKETS)
+
+def status_class(status_code):
+    return f"{int(status_code) // 100}xx"
+
+class LatencyHistogram:
+    def __init__(self, counts=None):
+        self.counts = {}
+        self.sum_ms = 0.0
+        if counts:
+            self.merge(counts)
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def record(self, value_ms, count=1):
+        index = bucket_index(value_ms)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.sum_ms += value_ms * count
+
+    def merge(self, other):
+        """Add another histogram (or a {bucket: count} mapping) into this one"""
+        counts = other
+        if isinstance(other, LatencyHistogram):
+            self.sum_ms += other.sum_ms
+            counts = other.counts
+        for index, count in counts.items():
+            index = int(index)
+            self.counts[index] = self.counts.get(index, 0) + int(count)
+        return self
+
+    def cumulative(self, indexes):
+        """[(bucket upper bound, count of values in that bucket or below)] for the given bucket indexes"""
+        ordered = sorted(self.counts.items())
+        result, seen, position = [], 0, 0
+        for index in sorted(indexes):
+            while position < len(ordered) and ordered[position][0] <= index:
+                seen += ordered[position][1]
+                position += 1
+            result.append((bucket_upper_bound(index), seen))
+        return result
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, or None when empty"""
+        total = self.count
+        if not total:
+            return None
+        rank = max(1, math.ceil(total * percent / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return round(bucket_upper_bound(index), 2)
+        return round(bucket_upper_bound(max(self.counts)), 2)
+
+    def percentiles(self, percents=DEFAULT_PERCENTILES, ceiling=None):
+        """{'p50': ..., 'p95': ...}; ceiling (the recorded maximum) caps the bucket bound"""
+        result = {}
+        for percent in percents:
+            value = self.percentile(percent)
+            if value is not None and ceiling is not None:
+                value = min(value, ceiling)
+            result[f"p{percent:g}"] = value
+        return result
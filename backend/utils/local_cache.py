@@ -0,0 +1,109 @@
+"""
+In-Process Response Cache
+A bounded LRU with per-entry TTL that sits in front of Redis (L1 in front of L2).
+Workers stay coherent through a Redis pub/sub channel carrying the keys each
+invalidation dropped; an entry is only served while this process is subscribed.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from redis.exceptions import RedisError
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+INVALIDATE_ALL = '*'
+
+class LocalCache:
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.connected = False
+        # Bumped by every invalidation; a fill that started before one is discarded
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.connected:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, generation=None):
+        if not self.connected:
+            return
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def apply(self, message):
+        """Apply an invalidation message: a JSON list of keys, or '*' for everything"""
+        if message == INVALIDATE_ALL:
+            self.clear()
+        else:
+            self.delete(*json.loads(message))
+
+    def __len__(self):
+        return len(self._entries)
+
+def invalidation_message(keys):
+    return json.dumps(sorted(keys))
+
+class InvalidationListener(threading.Thread):
+    """Subscribes to the invalidation channel and applies each message to the local cache"""
+
+    def __init__(self, redis_client, local_cache, channel=INVALIDATION_CHANNEL, retry_delay=1.0):
+        super().__init__(name='cache-invalidation-listener', daemon=True)
+        self.redis_client = redis_client
+        self.local_cache = local_cache
+        self.channel = channel
+        self.retry_delay = retry_delay
+
+    def run(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Invalidations published while we were not subscribed are lost
+                self.local_cache.clear()
+                self.local_cache.connected = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self.local_cache.apply(message['data'])
+            except (RedisError, ValueError, OSError):
+                pass
+            finally:
+                self.local_cache.connected = False
+                self.local_cache.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except (RedisError, OSError):
+                        pass
+            time.sleep(self.retry_delay)
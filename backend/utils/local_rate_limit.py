@@ -0,0 +1,76 @@
+"""
+In-Process Rate Limit Pre-Filter
+Approximates each client's GCRA budget locally so most requests are decided
+without a Redis round trip. A worker only syncs with Redis once its local
+estimate is older than the sync interval, or when the request would spend more
+than its local share of the remaining budget (i.e. near the threshold).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class _ClientBudget:
+    __slots__ = ('debt_ms', 'synced_at', 'pending_ms')
+
+    def __init__(self, debt_ms, synced_at):
+        self.debt_ms = debt_ms
+        self.synced_at = synced_at
+        self.pending_ms = 0
+
+class LocalRateLimiter:
+    def __init__(self, period_ms, local_fraction=0.1, sync_interval=1.0, max_clients=10000):
+        self.period_ms = period_ms
+        self.local_fraction = local_fraction
+        self.sync_interval = sync_interval
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_local(self, key, increment_ms):
+        """
+        Returns (allowed, debt_ms) when the request can be decided locally, or
+        None when it has to be synced with Redis. Locally allowed charges are
+        kept as pending and sent with the next sync.
+        """
+        now = time.monotonic()
+        with self._lock:
+            budget = self._clients.get(key)
+            if budget is None or now - budget.synced_at >= self.sync_interval:
+                return None
+            # The synced debt drains in real time; other workers' charges are unknown,
+            # so this is a lower bound and a local rejection is always correct
+            debt = max(0, budget.debt_ms - (now - budget.synced_at) * 1000) + budget.pending_ms
+            if debt + increment_ms > self.period_ms:
+                return False, debt
+            allowance = (self.period_ms - budget.debt_ms) * self.local_fraction
+            if budget.pending_ms + increment_ms > allowance:
+                return None
+            budget.pending_ms += increment_ms
+            return True, debt + increment_ms
+
+    def take_pending(self, key):
+        with self._lock:
+            budget = self._clients.get(key)
+            if budget is None:
+                return 0
+            pending, budget.pending_ms = budget.pending_ms, 0
+            return pending
+
+    def restore_pending(self, key, pending_ms):
+        with self._lock:
+            budget = self._clients.get(key)
+            if budget is not None:
+                budget.pending_ms += pending_ms
+
+    def record_sync(self, key, debt_ms):
+        """Adopt the debt Redis reported after a synced decision"""
+        with self._lock:
+            budget = self._clients.get(key)
+            if budget is None:
+                self._clients[key] = _ClientBudget(debt_ms, time.monotonic())
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                budget.debt_ms = debt_ms
+                budget.synced_at = time.monotonic()
+                self._clients.move_to_end(key)
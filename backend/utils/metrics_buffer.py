@@ -0,0 +1,198 @@
+"""
+Buffered Metrics Writer
+Aggregates metric updates in process and writes them to Redis in one pipeline,
+on an interval or once enough updates are pending. Counters use atomic
+HINCRBY / HINCRBYFLOAT and extremes ZADD GT / LT, so workers never overwrite
+each other; recording a metric on the request path is a dictionary update.
+Point-in-time values that only the worker itself knows (its connection pools)
+come from registered gauge sources, sampled at every flush into a short-lived
+per-worker hash so a scrape can sum them over the workers still alive.
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+WORKERS_KEY = 'metrics:workers'  # zset of worker id -> last flush time
+WORKER_GAUGES_MIN_TTL = 30
+
+def worker_gauges_key(worker_id):
+    return f"metrics:worker:{worker_id}"
+
+_gauge_sources = {}
+
+def register_gauge_source(name, source):
+    """source() returns {field: number}; sampled at every flush of this worker's buffer. Replaces any source of that name."""
+    _gauge_sources[name] = source
+
+def live_workers(redis_client, max_age):
+    """Ids of the workers that flushed within max_age seconds (forgetting the rest)"""
+    cutoff = time.time() - max_age
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyscore(WORKERS_KEY, '-inf', cutoff)
+    pipe.zrange(WORKERS_KEY, 0, -1)
+    return pipe.execute()[1]
+
+class MetricsBuffer:
+    def __init__(self, redis_client, flush_interval=5.0, max_pending=1000):
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.gauge_ttl = max(WORKER_GAUGES_MIN_TTL, int(3 * flush_interval))
+        self._lock = threading.Lock()
+        # One flush at a time, so a reader that flushes first sees everything recorded before
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._counters = defaultdict(int)
+        self._maxima = {}
+        self._minima = {}
+        self._tops = {}
+        self._ttls = {}
+        self._pending = 0
+
+    def _touch(self, key, ttl):
+        self._ttls[key] = ttl
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self._wake.set()
+
+    def incr(self, key, field, amount=1, ttl=None):
+        with self._lock:
+            self._counters[key, field] += amount
+            self._touch(key, ttl)
+
+    def maximum(self, key, member, value, ttl=None):
+        with self._lock:
+            current = self._maxima.get((key, member))
+            if current is None or value > current:
+                self._maxima[key, member] = value
+            self._touch(key, ttl)
+
+    def minimum(self, key, member, value, ttl=None):
+        with self._lock:
+            current = self._minima.get((key, member))
+            if current is None or value < current:
+                self._minima[key, member] = value
+            self._touch(key, ttl)
+
+    def top(self, key, member, score, cap, ttl=None):
+        """ZADD member to a sorted set that keeps only the cap highest scores"""
+        with self._lock:
+            entries = self._tops.setdefault((key, cap), {})
+            entries[member] = score
+            if len(entries) > cap:
+                del entries[min(entries, key=entries.get)]
+            self._touch(key, ttl)
+
+    def _sample_gauges(self):
+        gauges = {}
+        for name, source in list(_gauge_sources.items()):
+            try:
+                gauges.update(source())
+            except Exception as e:
+                logger.warning(f"Gauge source {name} failed: {e}")
+        return gauges
+
+    def _merge_back(self, counters, maxima, minima, tops):
+        # A failed flush is retried with the next one; the aggregates stay bounded
+        for item, amount in counters.items():
+            self._counters[item] += amount
+        for item, value in maxima.items():
+            if item not in self._maxima or value > self._maxima[item]:
+                self._maxima[item] = value
+        for item, value in minima.items():
+            if item not in self._minima or value < self._minima[item]:
+                self._minima[item] = value
+        for (key, cap), entries in tops.items():
+            merged = {**entries, **self._tops.get((key, cap), {})}
+            self._tops[key, cap] = dict(sorted(merged.items(), key=lambda item: item[1])[-cap:])
+
+    def flush(self):
+        """Write everything pending in one pipeline; returns the number of commands sent"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if not self._pending and not _gauge_sources:
+                return 0
+            counters, maxima, minima, tops, ttls = (
+                self._counters, self._maxima, self._minima, self._tops, self._ttls
+            )
+            self._reset()
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for (key, field), amount in counters.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(key, field, round(amount, 3))
+            else:
+                pipe.hincrby(key, field, amount)
+        for (key, member), value in maxima.items():
+            pipe.zadd(key, {member: value}, gt=True)
+        for (key, member), value in minima.items():
+            pipe.zadd(key, {member: value}, lt=True)
+        for (key, cap), entries in tops.items():
+            pipe.zadd(key, entries)
+            pipe.zremrangebyrank(key, 0, -cap - 1)
+        for key, ttl in ttls.items():
+            if ttl:
+                pipe.expire(key, ttl)
+        gauges = self._sample_gauges()
+        if gauges:
+            gauges_key = worker_gauges_key(self.worker_id)
+            pipe.delete(gauges_key)
+            pipe.hset(gauges_key, mapping=gauges)
+            pipe.expire(gauges_key, self.gauge_ttl)
+            pipe.zadd(WORKERS_KEY, {self.worker_id: time.time()})
+        commands = len(pipe)
+        try:
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to flush metrics, keeping them for the next flush: {e}")
+            with self._lock:
+                self._merge_back(counters, maxima, minima, tops)
+                for key, ttl in ttls.items():
+                    self._touch(key, ttl)
+            return 0
+        return commands
+
+    def run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+def get_metrics_buffer():
+    """The worker's metrics buffer, created (with its flusher thread) on first use after fork"""
+    global _buffer, _buffer_pid
+    if _buffer_pid != os.getpid():
+        with _buffer_lock:
+            if _buffer_pid != os.getpid():
+                from backend.config import Config
+                from backend.utils.cache import get_redis_client
+                _buffer = MetricsBuffer(
+                    get_redis_client(),
+                    flush_interval=Config.METRICS_FLUSH_INTERVAL,
+                    max_pending=Config.METRICS_FLUSH_MAX_PENDING
+                )
+                threading.Thread(target=_buffer.run, name='metrics-flusher', daemon=True).start()
+                atexit.register(_buffer.flush)
+                _buffer_pid = os.getpid()
+    return _buffer
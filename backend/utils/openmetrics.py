@@ -0,0 +1,214 @@
+"""
+OpenMetrics Exposition
+Renders the metrics every worker already aggregates in Redis (today's request
+counters and latency histograms, cache, rate-limit and DB counters) plus the
+per-worker pool gauges and Celery queue depths as OpenMetrics text. Counters
+are the day's totals, so each series carries a _created timestamp of local
+midnight and scrapers treat the daily rollover as a counter reset.
+"""
+import time
+import weakref
+from backend.extensions import db
+from backend.utils.cache import get_redis_client, redis_client, redis_binary_client, redis_breaker, is_warming_request
+from backend.utils.cache_metrics import cache_metrics_key, rate_limit_metrics_key, CACHE_COUNTERS
+from backend.utils.latency_histogram import MAX_BUCKET, SUB_BUCKETS
+from backend.utils.metrics_buffer import (
+    get_metrics_buffer, register_gauge_source, live_workers, worker_gauges_key
+)
+from backend.utils.performance import perf_stats_key, perf_histogram_key, histograms_from_fields
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PREFIX = 'quizmaster'
+# One exposed bucket per power of two; the stored histograms are finer and sum exactly into these
+EXPOSED_BUCKETS = tuple(range(0, MAX_BUCKET + 1, SUB_BUCKETS))
+
+GAUGE_HELP = {
+    'db_pool_connections': 'SQLAlchemy pool connections by state, summed over workers',
+    'db_pool_size': 'Configured SQLAlchemy pool size, summed over workers',
+    'redis_pool_connections': 'Redis client pool connections by state, summed over workers',
+    'redis_pool_max_connections': 'Redis client pool limit, summed over workers',
+    'redis_breaker_open': 'Workers whose Redis circuit breaker is open',
+}
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(round(value, 6))
+
+class _Exposition:
+    def __init__(self, created):
+        self.lines = []
+        self.created = created
+
+    def family(self, name, kind, help_text, unit=None):
+        self.lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        self.lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        if unit:
+            self.lines.append(f"# UNIT {PREFIX}_{name} {unit}")
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f"{PREFIX}_{name}{_labels(labels)} {_number(value)}")
+
+    def counter(self, name, value, **labels):
+        self.sample(f"{name}_total", value, **labels)
+        self.sample(f"{name}_created", self.created, **labels)
+
+    def text(self):
+        return '\n'.join(self.lines + ['# EOF']) + '\n'
+
+def _midnight():
+    now = time.localtime()
+    return time.mktime((now.tm_year, now.tm_mon, now.tm_mday, 0, 0, 0, 0, 0, -1))
+
+def _request_metrics(out, fields, histogram_fields):
+    out.family('http_requests', 'counter', 'Requests handled today, by status code')
+    for field, value in sorted(fields.items()):
+        name, code = field.rsplit('|', 1)
+        if name == 'status':
+            out.counter('http_requests', value, code=code)
+
+    out.family('http_request_duration_seconds', 'histogram', 'Request latency by route and status class', 'seconds')
+    for endpoint, by_class in sorted(histograms_from_fields(histogram_fields).items()):
+        method, _, route = endpoint.partition(' ')
+        for klass, histogram in sorted(by_class.items()):
+            labels = {'method': method, 'route': route, 'status': klass}
+            for bound, count in histogram.cumulative(EXPOSED_BUCKETS):
+                out.sample('http_request_duration_seconds_bucket', count, **labels, le=_number(round(bound / 1000, 6)))
+            out.sample('http_request_duration_seconds_bucket', histogram.count, **labels, le='+Inf')
+            out.sample('http_request_duration_seconds_count', histogram.count, **labels)
+            out.sample('http_request_duration_seconds_sum', histogram.sum_ms / 1000, **labels)
+            out.sample('http_request_duration_seconds_created', out.created, **labels)
+
+    out.family('db_queries', 'counter', 'SQL statements executed today')
+    out.counter('db_queries', fields.get('db|count', 0))
+    out.family('db_query_seconds', 'counter', 'Time spent executing SQL statements today', 'seconds')
+    out.counter('db_query_seconds', float(fields.get('db|time_ms', 0)) / 1000)
+
+def _cache_metrics(out, cache_fields, rate_limit_fields):
+    events = [name for name in CACHE_COUNTERS if name not in ('recompute_ms', 'bytes')]
+    counters = {}
+    for field, value in cache_fields.items():
+        endpoint, name = field.rsplit(':', 1)
+        counters.setdefault(endpoint, {})[name] = value
+
+    out.family('cache_events', 'counter', 'Response cache lookups and recomputes today, by endpoint and outcome')
+    for endpoint, values in sorted(counters.items()):
+        for name in events:
+            if name in values:
+                out.counter('cache_events', values[name], endpoint=endpoint, event=name)
+    out.family('cache_recompute_seconds', 'counter', 'Time spent recomputing cached responses today', 'seconds')
+    for endpoint, values in sorted(counters.items()):
+        if 'recompute_ms' in values:
+            out.counter('cache_recompute_seconds', float(values['recompute_ms']) / 1000, endpoint=endpoint)
+
+    out.family('rate_limit_decisions', 'counter', 'Rate limit decisions today, by outcome')
+    for outcome, value in sorted(rate_limit_fields.items()):
+        out.counter('rate_limit_decisions', value, outcome=outcome)
+
+def _worker_gauges(out, redis, max_age):
+    workers = live_workers(redis, max_age)
+    pipe = redis.pipeline(transaction=False)
+    for worker_id in workers:
+        pipe.hgetall(worker_gauges_key(worker_id))
+    totals = {}
+    for gauges in pipe.execute() if workers else []:
+        for field, value in gauges.items():
+            totals[field] = totals.get(field, 0) + float(value)
+
+    out.family('workers', 'gauge', 'Web workers that reported metrics recently')
+    out.sample('workers', len(workers))
+    families = {}
+    for field, value in sorted(totals.items()):
+        name, _, labels = field.partition('|')
+        families.setdefault(name, []).append((dict(pair.split('=', 1) for pair in labels.split(',') if pair), value))
+    for name, samples in families.items():
+        out.family(name, 'gauge', GAUGE_HELP.get(name, name.replace('_', ' ')))
+        for labels, value in samples:
+            out.sample(name, value, **labels)
+
+def _celery_queue_depths(out):
+    from backend.celery_app import celery
+    queues = {celery.conf.task_default_queue}
+    queues.update(route['queue'] for route in (celery.conf.task_routes or {}).values() if 'queue' in route)
+    queues = sorted(queues)
+    pipe = get_redis_client().pipeline(transaction=False)
+    for queue in queues:
+        pipe.llen(queue)
+    out.family('celery_queue_depth', 'gauge', 'Tasks waiting in each Celery queue')
+    for queue, depth in zip(queues, pipe.execute()):
+        out.sample('celery_queue_depth', depth, queue=queue)
+
+def render_metrics():
+    """OpenMetrics text for today's metrics of all workers; raises RedisError if Redis is unavailable"""
+    buffer = get_metrics_buffer()
+    buffer.flush()
+    redis = get_redis_client()
+    pipe = redis.pipeline(transaction=False)
+    pipe.hgetall(perf_stats_key())
+    pipe.hgetall(perf_histogram_key())
+    pipe.hgetall(cache_metrics_key())
+    pipe.hgetall(rate_limit_metrics_key())
+    fields, histogram_fields, cache_fields, rate_limit_fields = pipe.execute()
+
+    out = _Exposition(created=_midnight())
+    _request_metrics(out, fields, histogram_fields)
+    _cache_metrics(out, cache_fields, rate_limit_fields)
+    _worker_gauges(out, redis, buffer.gauge_ttl)
+    _celery_queue_depths(out)
+    return out.text()
+
+def _gauge_field(name, **labels):
+    return name + '|' + ','.join(f'{label}={value}' for label, value in labels.items())
+
+def _db_pool_gauges(engine_ref):
+    def db_pool_gauges():
+        engine = engine_ref()
+        if engine is None:
+            return {}
+        pool = engine.pool
+        gauges = {}
+        # Only QueuePool-style pools track checkouts; SQLite in memory runs on a static pool
+        for state, method in (('checked_out', 'checkedout'), ('checked_in', 'checkedin'), ('overflow', 'overflow')):
+            if callable(getattr(pool, method, None)):
+                gauges[_gauge_field('db_pool_connections', state=state)] = max(0, getattr(pool, method)())
+        if callable(getattr(pool, 'size', None)):
+            gauges[_gauge_field('db_pool_size')] = pool.size()
+        return gauges
+    return db_pool_gauges
+
+def redis_pool_gauges():
+    gauges = {_gauge_field('redis_breaker_open'): int(redis_breaker.state != redis_breaker.CLOSED)}
+    for name, client in (('text', redis_client), ('binary', redis_binary_client)):
+        connection_pool = client.connection_pool
+        created = len(getattr(connection_pool, '_connections', ()))
+        # BlockingConnectionPool keeps idle connections (and None placeholders) in a queue
+        idle = sum(1 for connection in getattr(getattr(connection_pool, 'pool', None), 'queue', ()) if connection)
+        gauges[_gauge_field('redis_pool_connections', client=name, state='in_use')] = max(0, created - idle)
+        gauges[_gauge_field('redis_pool_connections', client=name, state='idle')] = idle
+        gauges[_gauge_field('redis_pool_max_connections', client=name)] = connection_pool.max_connections
+    return gauges
+
+def register_pool_gauges(app):
+    """
+    Report the worker's SQLAlchemy and Redis pool usage with every metrics flush,
+    from its first real request on: processes that only build an app to run a
+    task (Celery, the CLI) or to warm the cache never report. Sources are keyed,
+    so rebuilding the app replaces them, and the engine is only weakly referenced.
+    """
+    registered = []
+
+    def register_on_first_request():
+        if registered or is_warming_request():
+            return
+        registered.append(True)
+        register_gauge_source('db_pool', _db_pool_gauges(weakref.ref(db.engine)))
+        register_gauge_source('redis_pool', redis_pool_gauges)
+
+    app.before_request(register_on_first_request)
@@ -0,0 +1,82 @@
+"""
+Keyset Pagination and Streaming Module
+Provides cursor based paging (?after_id=&limit=) and incremental JSON streaming for list endpoints
+"""
+from itertools import islice
+from flask import request, jsonify, current_app, Response, stream_with_context
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def get_keyset_args():
+    """Read after_id, limit and stream flags from the query string"""
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+    return after_id, limit, stream
+
+def keyset_query(query, id_column, after_id=None, limit=None):
+    """Order a query by its id column and restrict it to rows after the cursor"""
+    query = query.order_by(None).order_by(id_column)
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def stream_json_list(key, query, serialize, batch_size=STREAM_BATCH_SIZE):
+    """
+    Stream {"<key>": [...]} one item at a time from a yield_per cursor,
+    so memory stays bounded by the batch size instead of the table size.
+    The first batch is fetched and serialized before the response starts, so
+    a failing query still raises in the view and gets a proper error status.
+    A failure after that can only end the document: the list is closed and
+    an "error" member is added, so clients never parse truncated JSON.
+    """
+    rows = iter(query.yield_per(batch_size))
+    first_batch = [current_app.json.dumps(serialize(row)) for row in islice(rows, batch_size)]
+
+    def generate():
+        yield '{' + current_app.json.dumps(key) + ':[' + ','.join(first_batch)
+        first = not first_batch
+        try:
+            for row in rows:
+                item = current_app.json.dumps(serialize(row))
+                yield item if first else ',' + item
+                first = False
+        except Exception as e:
+            current_app.logger.error(f"Streaming {key} failed: {e}")
+            yield '],"error":' + current_app.json.dumps(f'Streaming {key} failed; the list is incomplete') + '}'
+            return
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def paginated_list_response(key, query, id_column, serialize):
+    """
+    Respond with the list endpoint payload in one of three modes:
+    - no paging args: the full list in the query's own order (legacy behaviour)
+    - ?after_id=&limit=: one keyset page plus the cursor for the next page
+    - ?stream=1: the whole (optionally cursor-restricted) list streamed incrementally
+    """
+    after_id, limit, stream = get_keyset_args()
+
+    if stream:
+        return stream_json_list(key, keyset_query(query, id_column, after_id, limit), serialize)
+
+    if after_id is None and limit is None:
+        return jsonify({key: [serialize(row) for row in query.all()]}), 200
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    rows = keyset_query(query, id_column, after_id, limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        key: [serialize(row) for row in rows],
+        'next_after_id': rows[-1].id if has_more else None,
+        'limit': limit
+    }), 200
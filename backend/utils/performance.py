@@ -1,13 +1,53 @@
 """
 Performance Monitoring Middleware
-Provides response time tracking and performance metrics
+Provides response time tracking and performance metrics.
+Requests are aggregated per worker and flushed to per-day Redis hashes by the
+metrics buffer rather than written to Redis one by one. Latency is also kept as
+log-bucket histograms per endpoint and status class, so tail percentiles can be
+read for any window of days. Requests slower than SLOW_REQUEST_THRESHOLD_MS are
+kept, with their context, in a capped per-day sorted set scored by latency.
+Per-request SQL counts (see query_metrics) are stored per endpoint, sent in a
+Server-Timing header, and statement shapes a request repeated are counted.
+Individual statements slower than SLOW_SQL_THRESHOLD_MS are kept with their
+query plan in another capped per-day sorted set.
 """
 import time
 import functools
 from flask import request, g, current_app
 from backend.utils.cache import get_redis_client
+from backend.utils.cache_metrics import get_cache_metrics
+from backend.utils.metrics_buffer import get_metrics_buffer
+from backend.utils.latency_histogram import LatencyHistogram, bucket_index, status_class, DEFAULT_PERCENTILES
 import json
 
+PERF_STATS_TTL = 8 * 86400  # a week of history plus today
+SLOW_REQUEST_MS = 1000
+SLOW_REQUEST_MAX_ENTRIES = 200  # per day, the slowest are kept
+
+def perf_stats_key(day=None):
+    return f"stats:perf:{day or time.strftime('%Y-%m-%d')}"
+
+def slow_requests_key(day=None):
+    return f"{perf_stats_key(day)}:slow"
+
+def slow_statements_key(day=None):
+    return f"{perf_stats_key(day)}:slow_sql"
+
+def repeated_statements_key(day=None):
+    """Hash of endpoint|statement fingerprint -> requests that repeated it past QUERY_REPEAT_THRESHOLD"""
+    return f"{perf_stats_key(day)}:repeats"
+
+def perf_histogram_key(day=None):
+    """Hash of bucket counts, one field per endpoint|status class|bucket"""
+    return f"{perf_stats_key(day)}:hist"
+
+def _recent_days(days):
+    return [time.strftime("%Y-%m-%d", time.localtime(time.time() - i * 86400)) for i in range(days)]
+
+def request_route():
+    """The matched URL rule (e.g. /api/admin/quiz/<int:quiz_id>) so metrics stay bounded by the route table"""
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
 def track_performance(func):
     """Decorator to track API performance metrics"""
     @functools.wraps(func)
@@ -22,114 +62,166 @@ def track_performance(func):
         response_time = (end_time - start_time) * 1000  # Convert to milliseconds
         
         # Store performance metrics
-        store_performance_metrics(request.path, request.method, response_time, response)
+        status_code = response[1] if isinstance(response, tuple) and len(response) > 1 else getattr(response, 'status_code', 200)
+        record_request(request.method, request_route(), status_code, response_time)
         
         return response
     
     return wrapper
 
-def store_performance_metrics(path, method, response_time, response):
-    """Store performance metrics in Redis"""
-    try:
-        redis_client = get_redis_client()
-        
-        # Get response status code
-        status_code = 200
-        if isinstance(response, tuple):
-            status_code = response[1] if len(response) > 1 else 200
-        
-        # Create metrics data
-        metrics = {
-            'path': path,
+def record_request(method, route, status_code, response_time):
+    """Aggregate one request into the worker's metrics buffer (no Redis I/O)"""
+    buffer = get_metrics_buffer()
+    key = perf_stats_key()
+    endpoint = f"{method} {route}"
+    
+    buffer.incr(key, 'total|count', 1, ttl=PERF_STATS_TTL)
+    buffer.incr(key, 'total|time_ms', float(response_time), ttl=PERF_STATS_TTL)
+    buffer.incr(key, f'status|{status_code}', 1, ttl=PERF_STATS_TTL)
+    buffer.incr(key, f'{endpoint}|count', 1, ttl=PERF_STATS_TTL)
+    buffer.incr(key, f'{endpoint}|time_ms', float(response_time), ttl=PERF_STATS_TTL)
+    buffer.incr(key, f'{endpoint}|db_queries', g.get('db_queries', 0), ttl=PERF_STATS_TTL)
+    buffer.incr(key, f'{endpoint}|db_time_ms', float(g.get('db_time_ms', 0)), ttl=PERF_STATS_TTL)
+    for fingerprint, count in g.get('db_repeated', {}).items():
+        buffer.incr(repeated_statements_key(), f'{endpoint}|{fingerprint}', 1, ttl=PERF_STATS_TTL)
+        buffer.maximum(f"{repeated_statements_key()}:max", f'{endpoint}|{fingerprint}', count, ttl=PERF_STATS_TTL)
+    series = f'{endpoint}|{status_class(status_code)}'
+    buffer.incr(perf_histogram_key(), f'{series}|{bucket_index(response_time)}', 1, ttl=PERF_STATS_TTL)
+    buffer.incr(perf_histogram_key(), f'{series}|sum', float(response_time), ttl=PERF_STATS_TTL)
+    for member in ('total', endpoint):
+        buffer.maximum(f"{key}:max", member, round(response_time, 2), ttl=PERF_STATS_TTL)
+        buffer.minimum(f"{key}:min", member, round(response_time, 2), ttl=PERF_STATS_TTL)
+    
+    config = current_app.config
+    if response_time > config.get('SLOW_REQUEST_THRESHOLD_MS', SLOW_REQUEST_MS):
+        context = {
+            'path': request.path,
             'method': method,
+            'endpoint': route,
             'response_time_ms': round(response_time, 2),
             'status_code': status_code,
             'timestamp': time.time(),
             'user_id': getattr(g, 'user_id', None),
-            'is_admin': getattr(g, 'is_admin', False)
+            'is_admin': getattr(g, 'is_admin', False),
+            'db_queries': g.get('db_queries', 0),
+            'db_time_ms': round(g.get('db_time_ms', 0), 2),
+            'repeated_statements': g.get('db_repeated', {})
         }
-        
-        # Store in Redis with TTL (24 hours)
-        key = f"perf:{path}:{method}:{int(time.time() // 3600)}"
-        redis_client.lpush(key, json.dumps(metrics))
-        redis_client.expire(key, 86400)  # 24 hours
-        
-        # Update aggregate statistics
-        update_aggregate_stats(path, method, response_time, status_code)
-        
-    except Exception as e:
-        current_app.logger.warning(f"Failed to store performance metrics: {e}")
+        buffer.top(slow_requests_key(), json.dumps(context, sort_keys=True), round(response_time, 2),
+                   config.get('SLOW_REQUEST_MAX_ENTRIES', SLOW_REQUEST_MAX_ENTRIES), ttl=PERF_STATS_TTL)
 
-def update_aggregate_stats(path, method, response_time, status_code):
-    """Update aggregate performance statistics"""
-    try:
-        redis_client = get_redis_client()
-        
-        # Key for aggregate stats (daily)
-        date_key = time.strftime("%Y-%m-%d")
-        stats_key = f"stats:aggregate:{date_key}"
-        
-        # Get current stats
-        current_stats = redis_client.get(stats_key)
-        if current_stats:
-            stats = json.loads(current_stats)
+def record_query(duration_ms):
+    """Count one executed SQL statement in today's stats"""
+    buffer = get_metrics_buffer()
+    key = perf_stats_key()
+    buffer.incr(key, 'db|count', 1, ttl=PERF_STATS_TTL)
+    buffer.incr(key, 'db|time_ms', float(duration_ms), ttl=PERF_STATS_TTL)
+
+def histograms_from_fields(fields, into=None):
+    """{endpoint: {status class: LatencyHistogram}} from the histogram hash fields"""
+    histograms = into if into is not None else {}
+    for field, value in fields.items():
+        endpoint, klass, index = field.rsplit('|', 2)
+        histogram = histograms.setdefault(endpoint, {}).setdefault(klass, LatencyHistogram())
+        if index == 'sum':
+            histogram.sum_ms += float(value)
         else:
-            stats = {
-                'total_requests': 0,
-                'total_response_time': 0,
-                'avg_response_time': 0,
-                'min_response_time': float('inf'),
-                'max_response_time': 0,
-                'status_codes': {},
-                'endpoints': {}
-            }
-        
-        # Update stats
-        stats['total_requests'] += 1
-        stats['total_response_time'] += response_time
-        stats['avg_response_time'] = stats['total_response_time'] / stats['total_requests']
-        stats['min_response_time'] = min(stats['min_response_time'], response_time)
-        stats['max_response_time'] = max(stats['max_response_time'], response_time)
-        
-        # Update status code counts
-        status_str = str(status_code)
-        stats['status_codes'][status_str] = stats['status_codes'].get(status_str, 0) + 1
-        
-        # Update endpoint stats
-        endpoint_key = f"{method}:{path}"
-        if endpoint_key not in stats['endpoints']:
-            stats['endpoints'][endpoint_key] = {
-                'count': 0,
-                'total_time': 0,
-                'avg_time': 0
-            }
-        
-        endpoint_stats = stats['endpoints'][endpoint_key]
-        endpoint_stats['count'] += 1
-        endpoint_stats['total_time'] += response_time
-        endpoint_stats['avg_time'] = endpoint_stats['total_time'] / endpoint_stats['count']
-        
-        # Store updated stats
-        redis_client.setex(stats_key, 86400, json.dumps(stats))
-        
-    except Exception as e:
-        current_app.logger.warning(f"Failed to update aggregate stats: {e}")
+            histogram.merge({index: value})
+    return histograms
+
+def _latency_summary(by_class, percentiles, ceiling=None):
+    merged = LatencyHistogram()
+    for histogram in by_class.values():
+        merged.merge(histogram)
+    summary = merged.percentiles(percentiles, ceiling)
+    summary['by_status_class'] = {
+        klass: {'count': histogram.count, **histogram.percentiles(percentiles, ceiling)}
+        for klass, histogram in sorted(by_class.items())
+    }
+    return summary
 
-def get_performance_stats(days: int = 7):
-    """Get performance statistics for the last N days"""
+def _daily_stats(fields, maxima, minima, histograms=None, percentiles=DEFAULT_PERCENTILES, repeats=None):
+    total_requests = int(float(fields.get('total|count', 0)))
+    total_time = float(fields.get('total|time_ms', 0))
+    stats = {
+        'total_requests': total_requests,
+        'total_response_time': round(total_time, 2),
+        'avg_response_time': round(total_time / total_requests, 2) if total_requests else 0,
+        'min_response_time': minima.get('total', 0),
+        'max_response_time': maxima.get('total', 0),
+        'status_codes': {},
+        'db': {'queries': int(float(fields.get('db|count', 0))), 'time_ms': round(float(fields.get('db|time_ms', 0)), 2)},
+        'endpoints': {}
+    }
+    for field, value in fields.items():
+        name, metric = field.rsplit('|', 1)
+        if name == 'status':
+            stats['status_codes'][metric] = int(float(value))
+        elif name == 'db':
+            continue
+        elif name != 'total':
+            endpoint_stats = stats['endpoints'].setdefault(name, {'count': 0, 'total_time': 0, 'db_queries': 0, 'db_time_ms': 0})
+            endpoint_stats[{'count': 'count', 'time_ms': 'total_time'}.get(metric, metric)] = float(value)
+    for name, endpoint_stats in stats['endpoints'].items():
+        count = endpoint_stats['count'] = int(endpoint_stats['count'])
+        endpoint_stats['total_time'] = round(endpoint_stats['total_time'], 2)
+        endpoint_stats['avg_time'] = round(endpoint_stats['total_time'] / count, 2) if count else 0
+        endpoint_stats['db_queries'] = int(endpoint_stats['db_queries'])
+        endpoint_stats['db_time_ms'] = round(endpoint_stats['db_time_ms'], 2)
+        endpoint_stats['avg_db_queries'] = round(endpoint_stats['db_queries'] / count, 2) if count else 0
+        endpoint_stats['min_time'] = minima.get(name)
+        endpoint_stats['max_time'] = maxima.get(name)
+    
+    overall = {}
+    for name, by_class in (histograms or {}).items():
+        if name in stats['endpoints']:
+            stats['endpoints'][name]['latency'] = _latency_summary(by_class, percentiles, maxima.get(name))
+        for klass, histogram in by_class.items():
+            overall.setdefault(klass, LatencyHistogram()).merge(histogram)
+    stats['latency'] = _latency_summary(overall, percentiles, maxima.get('total'))
+    stats['repeated_statements'] = _repeated_statements(*(repeats or ({}, {})))
+    return stats
+
+def _repeated_statements(requests, max_repeats):
+    """Repeated statement shapes, the ones hit by the most requests first"""
+    repeated = []
+    for field, count in requests.items():
+        endpoint, fingerprint = field.split('|', 1)
+        repeated.append({
+            'endpoint': endpoint,
+            'statement': fingerprint,
+            'requests': int(float(count)),
+            'max_per_request': int(max_repeats.get(field, 0))
+        })
+    repeated.sort(key=lambda entry: (entry['requests'], entry['max_per_request']), reverse=True)
+    return repeated
+
+def get_performance_stats(days: int = 7, percentiles=DEFAULT_PERCENTILES):
+    """Get performance statistics (including latency percentiles) for each of the last N days"""
     try:
+        get_metrics_buffer().flush()
         redis_client = get_redis_client()
-        stats = []
+        dates = _recent_days(days)
         
-        for i in range(days):
-            date_key = time.strftime("%Y-%m-%d", time.localtime(time.time() - i * 86400))
-            stats_key = f"stats:aggregate:{date_key}"
-            
-            daily_stats = redis_client.get(stats_key)
-            if daily_stats:
+        pipe = redis_client.pipeline(transaction=False)
+        for date_key in dates:
+            stats_key = perf_stats_key(date_key)
+            pipe.hgetall(stats_key)
+            pipe.zrange(f"{stats_key}:max", 0, -1, withscores=True)
+            pipe.zrange(f"{stats_key}:min", 0, -1, withscores=True)
+            pipe.hgetall(perf_histogram_key(date_key))
+            pipe.hgetall(repeated_statements_key(date_key))
+            pipe.zrange(f"{repeated_statements_key(date_key)}:max", 0, -1, withscores=True)
+        results = pipe.execute()
+        
+        stats = []
+        for i, date_key in enumerate(dates):
+            fields, maxima, minima, histogram_fields, repeats, max_repeats = results[6 * i:6 * i + 6]
+            if fields:
                 stats.append({
                     'date': date_key,
-                    'stats': json.loads(daily_stats)
+                    'stats': _daily_stats(fields, dict(maxima), dict(minima), histograms_from_fields(histogram_fields),
+                                          percentiles, (repeats, dict(max_repeats)))
                 })
         
         return stats
@@ -137,28 +229,58 @@ def get_performance_stats(days: int = 7):
         current_app.logger.error(f"Failed to get performance stats: {e}")
         return []
 
-def get_slow_queries(limit: int = 10):
-    """Get the slowest API queries"""
+def get_latency_percentiles(days: int = 1, percentiles=DEFAULT_PERCENTILES, endpoint=None):
+    """Latency percentiles over the whole window: the daily histograms of every worker merged"""
     try:
+        get_metrics_buffer().flush()
         redis_client = get_redis_client()
-        slow_queries = []
+        dates = _recent_days(days)
         
-        # Get all performance keys
-        perf_keys = redis_client.keys("perf:*")
-        
-        for key in perf_keys:
-            # Get recent entries for this endpoint
-            entries = redis_client.lrange(key, 0, 99)  # Last 100 entries
-            
-            for entry in entries:
-                try:
-                    data = json.loads(entry)
-                    if data['response_time_ms'] > 1000:  # Slower than 1 second
-                        slow_queries.append(data)
-                except:
-                    continue
-        
-        # Sort by response time and return top N
+        pipe = redis_client.pipeline(transaction=False)
+        for date_key in dates:
+            pipe.hgetall(perf_histogram_key(date_key))
+            pipe.zrange(f"{perf_stats_key(date_key)}:max", 0, -1, withscores=True)
+        results = pipe.execute()
+        
+        histograms, maxima = {}, {}
+        for fields, day_maxima in zip(results[::2], results[1::2]):
+            histograms_from_fields(fields, into=histograms)
+            for name, value in day_maxima:
+                maxima[name] = max(value, maxima.get(name, value))
+        if endpoint is not None:
+            histograms = {name: by_class for name, by_class in histograms.items() if name == endpoint}
+        
+        overall = {}
+        for by_class in histograms.values():
+            for klass, histogram in by_class.items():
+                overall.setdefault(klass, LatencyHistogram()).merge(histogram)
+        endpoints = {}
+        for name, by_class in sorted(histograms.items()):
+            endpoints[name] = {'count': sum(h.count for h in by_class.values()),
+                               **_latency_summary(by_class, percentiles, maxima.get(name))}
+        return {
+            'days': days,
+            'count': sum(h.count for h in overall.values()),
+            **_latency_summary(overall, percentiles, maxima.get('total') if endpoint is None else maxima.get(endpoint)),
+            'endpoints': endpoints
+        }
+    except Exception as e:
+        current_app.logger.error(f"Failed to get latency percentiles: {e}")
+        return {}
+
+def get_slow_queries(limit: int = 10, days: int = 1):
+    """Get the slowest requests of the last N days, slowest first"""
+    try:
+        get_metrics_buffer().flush()
+        redis_client = get_redis_client()
+        pipe = redis_client.pipeline(transaction=False)
+        for date_key in _recent_days(max(1, days)):
+            pipe.zrevrange(slow_requests_key(date_key), 0, limit - 1, withscores=True)
+        
+        slow_queries = []
+        for entries in pipe.execute():
+            for member, score in entries:
+                slow_queries.append({**json.loads(member), 'response_time_ms': score})
         slow_queries.sort(key=lambda x: x['response_time_ms'], reverse=True)
         return slow_queries[:limit]
         
@@ -166,28 +288,55 @@ def get_slow_queries(limit: int = 10):
         current_app.logger.error(f"Failed to get slow queries: {e}")
         return []
 
-def get_cache_performance():
-    """Get cache performance metrics"""
+def get_slow_statements(limit: int = 20, days: int = 1):
+    """Get the slowest recorded SQL statements of the last N days (with their plans), slowest first"""
     try:
+        get_metrics_buffer().flush()
         redis_client = get_redis_client()
+        pipe = redis_client.pipeline(transaction=False)
+        for date_key in _recent_days(max(1, days)):
+            pipe.zrevrange(slow_statements_key(date_key), 0, limit - 1, withscores=True)
         
-        # Get cache hit/miss statistics
-        cache_keys = redis_client.keys("cache:*")
-        rate_limit_keys = redis_client.keys("rate_limit:*")
+        statements = []
+        for entries in pipe.execute():
+            for member, score in entries:
+                statements.append({**json.loads(member), 'duration_ms': score})
+        statements.sort(key=lambda x: x['duration_ms'], reverse=True)
+        return statements[:limit]
         
-        # Calculate cache efficiency (this would need to be tracked separately)
-        cache_stats = {
-            'total_cache_keys': len(cache_keys),
-            'total_rate_limit_keys': len(rate_limit_keys),
-            'memory_usage': redis_client.info()['used_memory_human'],
-            'redis_version': redis_client.info()['redis_version']
-        }
+    except Exception as e:
+        current_app.logger.error(f"Failed to get slow statements: {e}")
+        return []
+
+def get_cache_performance(days: int = 1):
+    """Get cache performance metrics: per-endpoint hit ratios and recompute cost, plus Redis memory"""
+    try:
+        redis_client = get_redis_client()
+        info = redis_client.info()
+        
+        cache_stats = get_cache_metrics(days)
+        cache_stats.update({
+            'total_keys': redis_client.dbsize(),
+            'memory_usage': info['used_memory_human'],
+            'redis_version': info['redis_version']
+        })
         
         return cache_stats
     except Exception as e:
         current_app.logger.error(f"Failed to get cache performance: {e}")
         return {}
 
+def server_timing(total_ms):
+    """Server-Timing header value: time in SQL (with the statement count) and in the whole request"""
+    queries = g.get('db_queries', 0)
+    timings = [
+        f'db;dur={g.get("db_time_ms", 0):.2f};desc="{queries} {"query" if queries == 1 else "queries"}"',
+        f'app;dur={total_ms:.2f}'
+    ]
+    if g.get('db_repeated'):
+        timings.append(f'db-repeated;desc="{len(g.db_repeated)} repeated statement shapes"')
+    return ', '.join(timings)
+
 def performance_middleware():
     """Flask middleware for performance tracking"""
     def before_request():
@@ -197,6 +346,8 @@ def performance_middleware():
         if hasattr(g, 'start_time'):
             duration = time.time() - g.start_time
             response.headers['X-Response-Time'] = str(duration)
+            response.headers['Server-Timing'] = server_timing(duration * 1000)
+            record_request(request.method, request_route(), response.status_code, duration * 1000)
         return response
     
     return before_request, after_request 
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+SQL Query Metrics
+Engine events that time every executed statement and count it in the daily
+performance stats (query count and total DB time), and per request in
+g.db_queries / g.db_time_ms. Statements are also counted per request by
+fingerprint (the SQL with literals, bind placeholders of any paramstyle and IN
+lists collapsed); a shape repeated
+more than QUERY_REPEAT_THRESHOLD times in one request - usually an N+1 loop -
+is collected in g.db_repeated and, depending on QUERY_REPEAT_MODE, also
+logged ('warn') or turned into an error ('raise', for development and tests).
+A statement slower than SLOW_SQL_THRESHOLD_MS is recorded with its parameter
+shape, endpoint, calling code and query plan (EXPLAIN QUERY PLAN on SQLite,
+EXPLAIN inside a savepoint on Postgres, run on the same DBAPI connection without
+going through these events); each shape is explained at most once per
+SLOW_SQL_SAMPLE_INTERVAL per worker.
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from flask import g, request, current_app, has_app_context, has_request_context
+from sqlalchemy import event
+from backend.utils.metrics_buffer import get_metrics_buffer
+from backend.utils.performance import record_query, request_route, slow_statements_key, PERF_STATS_TTL
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Bind placeholders of every DBAPI paramstyle: %(name)s and %s (psycopg2), $1 (asyncpg), :name and :1
+_BIND_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STACK_SUMMARY_FRAMES = 5
+
+_sampled_at = {}
+_sampled_lock = threading.Lock()
+
+class RepeatedStatementError(RuntimeError):
+    """A request issued the same statement shape more than QUERY_REPEAT_THRESHOLD times"""
+
+@functools.lru_cache(maxsize=2048)
+def statement_fingerprint(statement):
+    """
+    Shape of a SQL statement: literals and bind placeholders of any paramstyle
+    become ?, and placeholder lists (?, ?, ...) become (?...)
+    """
+    fingerprint = _STRING_LITERAL.sub('?', statement)
+    fingerprint = _BIND_PLACEHOLDER.sub('?', fingerprint)
+    fingerprint = _NUMBER_LITERAL.sub('?', fingerprint)
+    fingerprint = _PLACEHOLDER_LIST.sub('(?...)', fingerprint)
+    return _WHITESPACE.sub(' ', fingerprint).strip()
+
+def _count_statement(statement):
+    fingerprint = statement_fingerprint(statement)
+    if 'db_statements' not in g:
+        g.db_statements = Counter()
+    g.db_statements[fingerprint] += 1
+    count = g.db_statements[fingerprint]
+
+    config = current_app.config
+    threshold = config.get('QUERY_REPEAT_THRESHOLD', 10)
+    if count <= threshold:
+        return
+    if 'db_repeated' not in g:
+        g.db_repeated = {}
+    g.db_repeated[fingerprint] = count
+    if count == threshold + 1:
+        mode = config.get('QUERY_REPEAT_MODE', 'record')
+        message = f"{request.method} {request_route()} ran the same statement more than {threshold} times: {fingerprint}"
+        if mode == 'raise':
+            raise RepeatedStatementError(message)
+        if mode == 'warn':
+            current_app.logger.warning(message)
+
+def _parameter_shape(parameters):
+    """Types of the bound parameters, not their values"""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _stack_summary():
+    """The innermost application frames that led to the statement"""
+    frames = [
+        f"{os.path.relpath(frame.filename, os.path.dirname(BACKEND_DIR))}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(BACKEND_DIR) and frame.filename != __file__
+    ]
+    return frames[-STACK_SUMMARY_FRAMES:]
+
+EXPLAIN_SAVEPOINT = 'slow_sql_explain'
+
+def explain_statement(cursor, dialect_name, statement, parameters):
+    """
+    Plan lines for a SELECT, from a fresh cursor on the same DBAPI connection.
+    Outside SQLite the EXPLAIN runs inside a savepoint, so a failing EXPLAIN
+    is rolled back on its own instead of aborting the request's transaction
+    (Postgres refuses every further statement in an aborted transaction).
+    """
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect_name == 'sqlite' else 'EXPLAIN '
+    connection = cursor.connection
+    use_savepoint = dialect_name != 'sqlite' and not getattr(connection, 'autocommit', False)
+    explain_cursor = connection.cursor()
+    try:
+        if use_savepoint:
+            explain_cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            # SQLite: (id, parent, notused, detail); Postgres: one text column
+            plan = [str(row[-1]) for row in explain_cursor.fetchall()]
+        except Exception:
+            if use_savepoint:
+                explain_cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            raise
+        if use_savepoint:
+            explain_cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        return plan
+    finally:
+        explain_cursor.close()
+
+def is_full_scan(plan_line):
+    """A plan step that reads a whole table (SQLite 'SCAN t' without an index, Postgres 'Seq Scan')"""
+    line = plan_line.strip()
+    if 'Seq Scan' in line:
+        return True
+    return line.startswith('SCAN ') and 'INDEX' not in line and line != 'SCAN CONSTANT ROW'
+
+def _should_sample(fingerprint, interval):
+    now = time.monotonic()
+    with _sampled_lock:
+        if now - _sampled_at.get(fingerprint, -interval) < interval:
+            return False
+        _sampled_at[fingerprint] = now
+        if len(_sampled_at) > 10000:
+            _sampled_at.clear()
+        return True
+
+def _record_slow_statement(conn, cursor, statement, parameters, executemany, duration_ms, config):
+    fingerprint = statement_fingerprint(statement)
+    if not _should_sample(fingerprint, config.get('SLOW_SQL_SAMPLE_INTERVAL', 60)):
+        return
+    entry = {
+        'statement': fingerprint,
+        'parameters': _parameter_shape(parameters),
+        'executemany': executemany,
+        'endpoint': f"{request.method} {request_route()}" if has_request_context() else None,
+        'stack': _stack_summary(),
+        'timestamp': time.time(),
+        'plan': None
+    }
+    if config.get('SLOW_SQL_EXPLAIN', True) and not executemany:
+        try:
+            entry['plan'] = explain_statement(cursor, conn.dialect.name, statement, parameters)
+        except Exception as e:
+            entry['explain_error'] = str(e)
+    if entry['plan']:
+        entry['full_scan'] = any(is_full_scan(line) for line in entry['plan'])
+    get_metrics_buffer().top(slow_statements_key(), json.dumps(entry, sort_keys=True), round(duration_ms, 2),
+                             config.get('SLOW_SQL_MAX_ENTRIES', 100), ttl=PERF_STATS_TTL)
+
+def register_query_metrics(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_query_time(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        record_query(duration_ms)
+        if has_app_context():
+            config = current_app.config
+            if duration_ms > config.get('SLOW_SQL_THRESHOLD_MS', 100):
+                _record_slow_statement(conn, cursor, statement, parameters, executemany, duration_ms, config)
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time_ms = g.get('db_time_ms', 0) + duration_ms
+            _count_statement(statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def discard_query_timer(exception_context):
+        connection = exception_context.connection
+        if isinstance(exception_context.original_exception, RepeatedStatementError):
+            return  # raised after the statement ran and its timer was popped
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
@@ -0,0 +1,135 @@
+"""
+Redis Connection Factory
+Builds the shared Redis clients from configuration (redis:// or unix:// URL,
+connect/read timeouts, bounded pool, health checks) behind a circuit breaker.
+After repeated connection failures every cache, rate-limit and metrics call is
+short-circuited for a cool-off period instead of each waiting out a timeout.
+"""
+import threading
+import time
+import redis
+from redis.client import Pipeline
+from redis.exceptions import (
+    ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError, ResponseError
+)
+
+class CircuitOpenError(RedisConnectionError):
+    """Raised instead of calling Redis while the breaker is open (a RedisError, so callers degrade as usual)"""
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=10.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.stats = dict.fromkeys(('failures', 'opened', 'short_circuited'), 0)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through; after the cool-off one trial call is let through"""
+        if self.state == self.CLOSED:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.stats['short_circuited'] += 1
+        raise CircuitOpenError('Redis circuit breaker is open')
+
+    def record_success(self):
+        if self.state == self.CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.stats['failures'] += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.stats['opened'] += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def call(self, func, *args, **kwargs):
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except (RedisConnectionError, RedisTimeoutError):
+            self.record_failure()
+            raise
+        except ResponseError:
+            # The server answered (NOSCRIPT, WRONGTYPE, ...), so it is reachable
+            self.record_success()
+            raise
+        except BaseException:
+            # Not a verdict on the server; release the half-open trial so the next call can retry
+            self._release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def _release_trial(self):
+        if self._trial_in_flight:
+            with self._lock:
+                self._trial_in_flight = False
+
+    def snapshot(self):
+        return {'state': self.state, 'consecutive_failures': self.failures, **self.stats}
+
+class BreakerPipeline(Pipeline):
+    def __init__(self, breaker, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute(self, raise_on_error=True):
+        return self.breaker.call(super().execute, raise_on_error)
+
+class BreakerRedis(redis.Redis):
+    """redis.Redis whose commands and pipelines go through a CircuitBreaker"""
+
+    def __init__(self, *args, breaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute_command(self, *args, **options):
+        return self.breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return BreakerPipeline(self.breaker, self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+def redis_settings(config_object):
+    """The REDIS_* settings of a config class (the clients are built at import, before any app exists)"""
+    return {name: getattr(config_object, name) for name in dir(config_object) if name.startswith('REDIS_')}
+
+def redis_url(config):
+    """REDIS_SOCKET_PATH (a unix socket) wins over REDIS_URL"""
+    socket_path = config.get('REDIS_SOCKET_PATH')
+    if socket_path:
+        return f"unix://{socket_path}?db={config.get('REDIS_DB', 0)}"
+    return config.get('REDIS_URL', 'redis://localhost:6379/0')
+
+def create_redis_client(config, breaker, decode_responses=True):
+    """A client on its own bounded pool; config is a mapping of the REDIS_* settings"""
+    pool = redis.BlockingConnectionPool.from_url(
+        redis_url(config),
+        max_connections=config.get('REDIS_MAX_CONNECTIONS', 50),
+        # Waiting for a free pooled connection is bounded like any other Redis call
+        timeout=config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+        socket_connect_timeout=config.get('REDIS_CONNECT_TIMEOUT', 0.25),
+        socket_timeout=config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+        health_check_interval=config.get('REDIS_HEALTH_CHECK_INTERVAL', 30),
+        decode_responses=decode_responses,
+    )
+    return BreakerRedis(connection_pool=pool, breaker=breaker)
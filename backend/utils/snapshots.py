@@ -0,0 +1,141 @@
+"""
+Quiz Payload Snapshots
+Pre-serialized (and pre-compressed) quiz payloads keyed by a per-quiz content version,
+served with ETag / If-None-Match revalidation
+"""
+import gzip
+import hashlib
+from flask import current_app, request, Response
+from redis.exceptions import RedisError
+from sqlalchemy.orm import joinedload, selectinload
+from backend.models.model import Quiz, Chapter
+from backend.utils.cache import get_redis_client, get_redis_binary_client
+from backend.utils.grading import invalidate_answer_key
+
+SNAPSHOT_TTL = 86400
+GZIP_MIN_BYTES = 1024
+# Part of the key; bump it when the payload shape changes so stored snapshots are never served
+# (2: answer keys removed from the student payload)
+SNAPSHOT_FORMAT = 2
+
+def quiz_version_key(quiz_id):
+    return f"quiz_version:{quiz_id}"
+
+def quiz_snapshot_key(quiz_id, version):
+    return f"cache:quiz_snapshot:v{SNAPSHOT_FORMAT}:{quiz_id}:{version}"
+
+def get_quiz_version(quiz_id):
+    return int(get_redis_client().get(quiz_version_key(quiz_id)) or 0)
+
+def invalidate_quiz_content(*quiz_ids):
+    """Bump the content version of each quiz after an edit; old snapshots simply stop being read"""
+    quiz_ids = [quiz_id for quiz_id in quiz_ids if quiz_id is not None]
+    if not quiz_ids:
+        return
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for quiz_id in quiz_ids:
+            pipe.incr(quiz_version_key(quiz_id))
+        pipe.execute()
+    except RedisError:
+        pass
+    for quiz_id in quiz_ids:
+        invalidate_answer_key(quiz_id)
+
+def build_quiz_payload(quiz_id):
+    """
+    The payload served by GET /api/user/quiz/<id>, or None if the quiz does not exist.
+    It never carries correct options: answers are graded on the server.
+    """
+    quiz = Quiz.query.options(
+        joinedload(Quiz.chapter).joinedload(Chapter.subject),
+        selectinload(Quiz.questions)
+    ).filter(Quiz.id == quiz_id).first()
+    if quiz is None:
+        return None
+    return {'quiz': {
+        'id': quiz.id,
+        'chapter_id': quiz.chapter_id,
+        'chapter': {
+            'id': quiz.chapter.id,
+            'name': quiz.chapter.name,
+            'subject': {
+                'id': quiz.chapter.subject.id,
+                'name': quiz.chapter.subject.name
+            } if quiz.chapter and quiz.chapter.subject else None
+        } if quiz.chapter else None,
+        'date_of_quiz': quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None,
+        'time_duration': quiz.time_duration,
+        'remarks': quiz.remarks,
+        'questions': [
+            {
+                'id': q.id,
+                'title': q.title,
+                'question_statement': q.question_statement,
+                'option1': q.option1,
+                'option2': q.option2,
+                'option3': q.option3,
+                'option4': q.option4
+            } for q in quiz.questions
+        ]
+    }}
+
+def render_snapshot(payload):
+    body = current_app.json.dumps(payload).encode('utf-8')
+    snapshot = {
+        b'etag': hashlib.sha1(body).hexdigest()[:20].encode(),
+        b'body': body,
+    }
+    if len(body) >= GZIP_MIN_BYTES:
+        snapshot[b'gzip'] = gzip.compress(body)
+    return snapshot
+
+def get_quiz_snapshot(quiz_id, if_none_match=None):
+    """
+    Return the snapshot fields for the quiz's current version, rendering and storing
+    it on a miss. When the client's ETag is current only the etag field is fetched.
+    Returns None if the quiz does not exist.
+    """
+    try:
+        key = quiz_snapshot_key(quiz_id, get_quiz_version(quiz_id))
+        binary_client = get_redis_binary_client()
+        if if_none_match:
+            etag = binary_client.hget(key, 'etag')
+            if etag and if_none_match.contains(etag.decode()):
+                return {b'etag': etag}
+        snapshot = binary_client.hgetall(key)
+        if snapshot:
+            return snapshot
+    except RedisError:
+        key = None
+
+    payload = build_quiz_payload(quiz_id)
+    if payload is None:
+        return None
+    snapshot = render_snapshot(payload)
+    if key:
+        try:
+            pipe = get_redis_binary_client().pipeline()
+            pipe.hset(key, mapping=snapshot)
+            pipe.expire(key, SNAPSHOT_TTL)
+            pipe.execute()
+        except RedisError:
+            pass
+    return snapshot
+
+def snapshot_response(snapshot):
+    """Serve snapshot bytes directly: 304 on a matching ETag, gzip when accepted"""
+    etag = snapshot[b'etag'].decode()
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    body = snapshot[b'body']
+    if b'gzip' in snapshot and 'gzip' in request.accept_encodings:
+        body = snapshot[b'gzip']
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, status=200, headers=headers, mimetype='application/json')